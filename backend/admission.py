@@ -0,0 +1,152 @@
+from collections import OrderedDict
+import threading
+import random
+import time
+import os
+
+from metrics import events_shed, requests_shed
+
+# gthread workers run WEB_THREADS requests at once; ingestion may hold at
+# most this many of them so logins and anomaly checks always find a thread
+DEFAULT_MAX_INFLIGHT = max(1, int(os.getenv('WEB_THREADS', 8)) * 3 // 4)
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`; rate 0 means unlimited"""
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic() if now is None else now
+
+    def refill(self, now):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        return self.tokens if self.rate else float('inf')
+
+    def level(self):
+        """Fill level from 0 to 1"""
+        return self.tokens / self.burst if self.rate else 1.0
+
+    def take(self, count, floor=0.0):
+        if self.rate:
+            self.tokens = max(floor, self.tokens - count)
+
+
+def downsample(rows, count):
+    """`count` rows spread evenly over `rows`, keeping their order"""
+    if count >= len(rows):
+        return rows
+    picks = [i * len(rows) // count for i in range(count)]
+    return rows.take(picks) if hasattr(rows, 'take') else [rows[i] for i in picks]
+
+
+class AdmissionController:
+    """
+    Token-bucket admission control for the event ingestion routes.
+
+    Every event costs one token from its session's bucket and one from a
+    global bucket sized to what the database writer can sustain. Keystrokes
+    are admitted first and mouse events get what is left; once the global
+    bucket drains below `mouse_shed_level` mouse events are also thinned out
+    in proportion, so a busy server keeps every keystroke for as long as it
+    can. Events a session sends past its own limit are charged too, down to
+    one burst of debt, so a client that keeps pushing stays shut out until
+    it backs off instead of getting a trickle through on every request.
+    Ingestion requests may only occupy `max_inflight` workers at once,
+    which keeps capacity free for login and anomaly checks; those routes are
+    never limited here.
+    """
+
+    def __init__(self, session_rate=50.0, session_burst=500, global_rate=20000.0, global_burst=40000,
+                 mouse_shed_level=0.5, max_inflight=DEFAULT_MAX_INFLIGHT, max_sessions=100000):
+        self.session_rate = session_rate
+        self.session_burst = session_burst
+        self.mouse_shed_level = mouse_shed_level
+        self.max_inflight = max_inflight
+        self.max_sessions = max_sessions
+        self.inflight = 0
+        self._global = TokenBucket(global_rate, global_burst)
+        self._sessions = OrderedDict()  # session_id -> TokenBucket
+        self._lock = threading.Lock()
+
+    def enter(self, route):
+        """Claim an ingestion slot; False (and counted as shed) if all are busy"""
+        with self._lock:
+            if self.max_inflight and self.inflight >= self.max_inflight:
+                requests_shed.inc(route, 'inflight')
+                return False
+            self.inflight += 1
+        return True
+
+    def leave(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def _session_bucket(self, session_id, now):
+        bucket = self._sessions.get(session_id)
+        if bucket is None:
+            bucket = self._sessions[session_id] = TokenBucket(self.session_rate, self.session_burst, now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+            bucket.refill(now)
+        return bucket
+
+    def admit(self, session_id, keystrokes, mice):
+        """Returns the (keystrokes, mice) rows to store; what is left out is counted as shed"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._session_bucket(session_id, now)
+            self._global.refill(now)
+            session_tokens, global_tokens = bucket.available(), self._global.available()
+            available = max(0.0, min(session_tokens, global_tokens, len(keystrokes) + len(mice)))
+            limit = 'session' if session_tokens <= global_tokens else 'global'
+
+            keep_keys = int(min(len(keystrokes), available))
+            keep_mice = int(min(len(mice), available - keep_keys))
+            pressure = self._global.level()
+            thinned = 0
+            if mice and pressure < self.mouse_shed_level:
+                # Stochastic rounding so single mouse events are thinned at the same rate as batches
+                share = len(mice) * pressure / self.mouse_shed_level
+                cap = int(share) + (random.random() < share - int(share))
+                thinned = max(0, keep_mice - cap)
+                keep_mice -= thinned
+            over = len(keystrokes) - keep_keys + len(mice) - keep_mice - thinned if limit == 'session' else 0
+            bucket.take(keep_keys + keep_mice + over, floor=-self.session_burst)
+            self._global.take(keep_keys + keep_mice)
+
+        if keep_keys < len(keystrokes):
+            events_shed.inc('keystroke', limit, amount=len(keystrokes) - keep_keys)
+        if thinned:
+            events_shed.inc('mouse', 'downsampled', amount=thinned)
+        if keep_mice + thinned < len(mice):
+            events_shed.inc('mouse', limit, amount=len(mice) - keep_mice - thinned)
+        return keystrokes[:keep_keys], downsample(mice, keep_mice)
+
+    def forget(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            self._global.refill(time.monotonic())
+            return {'inflight': self.inflight, 'tracked_sessions': len(self._sessions),
+                    'global_level': self._global.level()}
+
+
+# Global admission controller
+admission = AdmissionController(
+    session_rate=float(os.getenv('INGEST_SESSION_RATE', 50)),
+    session_burst=int(os.getenv('INGEST_SESSION_BURST', 500)),
+    global_rate=float(os.getenv('INGEST_GLOBAL_RATE', 20000)),
+    global_burst=int(os.getenv('INGEST_GLOBAL_BURST', 40000)),
+    mouse_shed_level=float(os.getenv('INGEST_MOUSE_SHED_LEVEL', 0.5)),
+    max_inflight=int(os.getenv('INGEST_MAX_INFLIGHT', DEFAULT_MAX_INFLIGHT))
+)
@@ -0,0 +1,158 @@
+from datetime import datetime
+import threading
+import atexit
+import uuid
+import time
+import os
+
+from database import db, Session, AnomalyAlert
+from logging_config import get_logger
+
+log = get_logger('alerts')
+
+# Client-supplied text is cut to fit, so one long value can't fail a whole batch insert
+ALERT_TYPE_LENGTH = AnomalyAlert.__table__.c.alert_type.type.length
+DESCRIPTION_LENGTH = AnomalyAlert.__table__.c.description.type.length
+
+
+class AlertWriter:
+    """
+    Write-behind persistence for anomaly alerts and session anomaly counts.
+    check_anomaly hands alerts over and answers straight away; a background
+    thread bulk-inserts the alerts and applies one coalesced UPDATE per
+    session every `flush_interval` seconds. Pending writes are flushed at
+    interpreter exit, and callers flush inline once `max_pending` alerts are
+    waiting so a stalled database can't grow the backlog without bound,
+    unless `inline_flush` is off and only the writer thread may write. A
+    batch the database rejects is retried row by row and the rows that still
+    fail are logged and dropped.
+    """
+
+    def __init__(self, flush_interval=0.5, batch_size=500, max_pending=10000):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        # Under ASGI submit() runs on the event loop, where a database write would stall every connection
+        self.inline_flush = True
+        self.app = None
+        self.flushed = 0
+        self._alerts = []
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread_pid = None
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self.shutdown)
+
+    def submit(self, session_id, alert_type, severity, description, anomaly_score, user_id=None):
+        """Queue an alert and its session update; returns the unsaved AnomalyAlert"""
+        alert = AnomalyAlert(
+            id=str(uuid.uuid4()), session_id=session_id, user_id=user_id,
+            alert_type=str(alert_type)[:ALERT_TYPE_LENGTH], severity=severity,
+            description=str(description)[:DESCRIPTION_LENGTH], anomaly_score=anomaly_score, created_at=datetime.utcnow(), resolved=False,
+            acknowledged=False
+        )
+        row = {c: getattr(alert, c) for c in ('id', 'session_id', 'user_id', 'alert_type', 'severity', 'description',
+                                               'anomaly_score', 'created_at', 'resolved', 'acknowledged')}
+        with self._lock:
+            self._alerts.append(row)
+            self._sessions[session_id] = self._sessions.get(session_id, 0) + 1
+            backlog = len(self._alerts)
+        self._ensure_thread()
+        if backlog >= self.max_pending and self.inline_flush:
+            self.flush()
+        elif backlog >= self.batch_size:
+            self._wake.set()
+        return alert
+
+    def pending(self, session_id):
+        """Anomalies queued for a session but not yet added to its anomaly_count"""
+        with self._lock:
+            return self._sessions.get(session_id, 0)
+
+    def _ensure_thread(self):
+        # Threads don't survive fork, so each worker process starts its own
+        if self._thread_pid != os.getpid():
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, daemon=True, name='alert-writer').start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception('Alert writer flush failed')
+                time.sleep(self.flush_interval)
+
+    def flush(self):
+        """Write everything pending in one transaction; returns the number of alerts written"""
+        with self._flush_lock:
+            with self._lock:
+                alerts, self._alerts = self._alerts, []
+                sessions, self._sessions = self._sessions, {}
+            if not alerts and not sessions:
+                return 0
+            with self.app.app_context():
+                try:
+                    self._write(alerts, sessions)
+                    written = len(alerts)
+                except Exception as e:
+                    db.session.rollback()
+                    log.warning('Alert flush of %d alerts failed, retrying one row at a time: %s', len(alerts), e)
+                    written = self._write_singly(alerts, sessions)
+            self.flushed += written
+            return written
+
+    def _write(self, alerts, sessions):
+        if alerts:
+            db.session.execute(db.insert(AnomalyAlert), alerts)
+        for session_id, anomalies in sessions.items():
+            db.session.execute(db.update(Session).where(Session.id == session_id).values(
+                anomaly_count=Session.anomaly_count + anomalies))
+        db.session.commit()
+
+    def _write_singly(self, alerts, sessions):
+        """One transaction per row, so a row the database rejects can't hold back the rest; those are dropped"""
+        written = 0
+        for row in alerts:
+            try:
+                self._write([row], {})
+                written += 1
+            except Exception as e:
+                db.session.rollback()
+                log.error('Dropping alert %s for session %s: %s', row['id'], row['session_id'], e)
+        for session_id, anomalies in sessions.items():
+            try:
+                self._write([], {session_id: anomalies})
+            except Exception as e:
+                db.session.rollback()
+                log.error('Dropping %d anomalies for session %s: %s', anomalies, session_id, e)
+        return written
+
+    def shutdown(self):
+        """Flush whatever is pending; called at exit and from server shutdown hooks"""
+        if self.app is None:
+            return
+        try:
+            written = self.flush()
+            if written:
+                log.info('Flushed %d pending alerts on shutdown', written)
+        except Exception:
+            log.exception('Could not flush pending alerts on shutdown')
+
+    @property
+    def backlog(self):
+        with self._lock:
+            return len(self._alerts)
+
+
+# Global alert writer
+alert_writer = AlertWriter(
+    flush_interval=float(os.getenv('ALERT_FLUSH_SECONDS', 0.5)),
+    batch_size=int(os.getenv('ALERT_BATCH_SIZE', 500))
+)
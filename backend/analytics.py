@@ -0,0 +1,187 @@
+from datetime import datetime, timedelta
+import threading
+import json
+import time
+import math
+import os
+
+from database import db, MetricRollup
+from logging_config import get_logger
+
+log = get_logger('analytics')
+
+GRANULARITIES = {
+    'minute': lambda ts: ts.replace(second=0, microsecond=0),
+    'hour': lambda ts: ts.replace(minute=0, second=0, microsecond=0)
+}
+
+# Metrics that carry a value distribution: metric -> (upper bound, bins)
+HISTOGRAM_METRICS = {
+    'session_confidence': (100.0, 20)
+}
+
+METRICS = ('alerts_by_severity', 'alerts_by_type', 'session_confidence', 'events', 'user_anomalies')
+
+
+class PendingRollup:
+    __slots__ = ('count', 'total', 'total_sq', 'histogram')
+
+    def __init__(self, bins=0):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.histogram = [0] * bins if bins else None
+
+    def add(self, value, count, upper):
+        self.count += count
+        if value is None:
+            return
+        self.total += value * count
+        self.total_sq += value * value * count
+        if self.histogram is not None:
+            bins = len(self.histogram)
+            index = min(bins - 1, max(0, int(value / upper * bins)))
+            self.histogram[index] += count
+
+
+class AnalyticsRollups:
+    """
+    Incrementally maintained per-minute and per-hour aggregates for the
+    admin Analytics tab. Writers record into in-memory buckets that are
+    merged into metric_rollups every `flush_interval` seconds, so reads
+    cost the number of buckets requested, not the volume of raw data.
+    """
+
+    def __init__(self, flush_interval=10.0):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, metric, dimension='', value=None, count=1, ts=None):
+        ts = ts or datetime.utcnow()
+        upper, bins = HISTOGRAM_METRICS.get(metric, (1.0, 0))
+        with self._lock:
+            for granularity, truncate in GRANULARITIES.items():
+                key = (granularity, truncate(ts), metric, str(dimension or ''))
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = PendingRollup(bins)
+                pending.add(value, count, upper)
+
+    def record_alert(self, alert, user_id):
+        self.record('alerts_by_severity', alert.severity, ts=alert.created_at)
+        self.record('alerts_by_type', alert.alert_type, ts=alert.created_at)
+        self.record('user_anomalies', user_id, ts=alert.created_at)
+
+    def flush_if_due(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Merge pending buckets into metric_rollups; needs an app context"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        try:
+            # Pending keys span very few buckets, so load existing rows per bucket
+            buckets = {(granularity, bucket) for granularity, bucket, _, _ in batch}
+            existing = {}
+            for granularity, bucket in buckets:
+                for row in MetricRollup.query.filter_by(granularity=granularity, bucket=bucket).with_for_update():
+                    existing[(granularity, bucket, row.metric, row.dimension)] = row
+
+            for key, pending in batch.items():
+                row = existing.get(key)
+                if row is None:
+                    granularity, bucket, metric, dimension = key
+                    row = MetricRollup(granularity=granularity, bucket=bucket, metric=metric, dimension=dimension,
+                                       count=0, total=0.0, total_sq=0.0)
+                    db.session.add(row)
+                row.count += pending.count
+                row.total += pending.total
+                row.total_sq += pending.total_sq
+                if pending.histogram is not None:
+                    merged = json.loads(row.histogram) if row.histogram else [0] * len(pending.histogram)
+                    row.histogram = json.dumps([a + b for a, b in zip(merged, pending.histogram)])
+            db.session.commit()
+            return len(batch)
+        except Exception as e:
+            db.session.rollback()
+            log.error('Analytics flush failed, keeping %d pending buckets: %s', len(batch), e)
+            with self._lock:
+                for key, pending in batch.items():
+                    current = self._pending.get(key)
+                    if current is not None:
+                        pending.count += current.count
+                        pending.total += current.total
+                        pending.total_sq += current.total_sq
+                        if pending.histogram is not None:
+                            pending.histogram = [a + b for a, b in zip(pending.histogram, current.histogram)]
+                    self._pending[key] = pending
+            return 0
+
+    def series(self, metric, granularity, start, end, dimension=None):
+        """Time series of rollup rows in [start, end), one point per bucket and dimension"""
+        query = MetricRollup.query.filter(
+            MetricRollup.metric == metric,
+            MetricRollup.granularity == granularity,
+            MetricRollup.bucket >= start,
+            MetricRollup.bucket < end
+        )
+        if dimension is not None:
+            query = query.filter(MetricRollup.dimension == dimension)
+        upper, _ = HISTOGRAM_METRICS.get(metric, (1.0, 0))
+        return [_point(row, upper) for row in query.order_by(MetricRollup.bucket, MetricRollup.dimension)]
+
+    def top_dimensions(self, metric, granularity, start, end, limit=10):
+        """Dimensions with the highest total count over [start, end), e.g. most anomalous users"""
+        total = db.func.sum(MetricRollup.count)
+        rows = db.session.query(MetricRollup.dimension, total).filter(
+            MetricRollup.metric == metric,
+            MetricRollup.granularity == granularity,
+            MetricRollup.bucket >= start,
+            MetricRollup.bucket < end
+        ).group_by(MetricRollup.dimension).order_by(total.desc()).limit(limit)
+        return [{'dimension': dimension, 'count': count} for dimension, count in rows]
+
+
+def _point(row, upper):
+    point = {'bucket': row.bucket.isoformat(), 'dimension': row.dimension, 'count': row.count}
+    if row.count and (row.total or row.histogram):
+        mean = row.total / row.count
+        point['mean'] = round(mean, 3)
+        point['std'] = round(math.sqrt(max(0.0, row.total_sq / row.count - mean * mean)), 3)
+    if row.histogram:
+        histogram = json.loads(row.histogram)
+        point['p50'] = _histogram_percentile(histogram, 50, upper)
+        point['p95'] = _histogram_percentile(histogram, 95, upper)
+    return point
+
+
+def _histogram_percentile(histogram, q, upper):
+    n = sum(histogram)
+    if not n:
+        return None
+    target = q / 100.0 * n
+    width = upper / len(histogram)
+    seen = 0
+    for i, c in enumerate(histogram):
+        seen += c
+        if seen >= target and c:
+            return round((i + 0.5) * width, 2)
+    return upper
+
+
+def default_range(granularity):
+    """Last 60 minutes or last 48 hours, ending after the current bucket"""
+    now = datetime.utcnow()
+    end = GRANULARITIES[granularity](now) + (timedelta(minutes=1) if granularity == 'minute' else timedelta(hours=1))
+    return end - (timedelta(minutes=60) if granularity == 'minute' else timedelta(hours=48)), end
+
+
+# Global analytics rollups
+analytics = AnalyticsRollups(flush_interval=float(os.getenv('ANALYTICS_FLUSH_SECONDS', 10)))
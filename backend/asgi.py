@@ -0,0 +1,510 @@
+"""
+ASGI entry point: uvicorn asgi:app --host 127.0.0.1 --port 5000
+
+Authentication, event ingestion and /api/anomaly/check are served natively
+on the event loop. They reach the database through SQLAlchemy's async
+engine (aiosqlite or asyncpg), and password hashing and model scoring run
+on a thread pool, so thousands of tracked sessions share one process
+without a thread each. Every other route is the Flask app, mounted as WSGI
+and run on threads. In-memory profile, analytics and confidence state is
+flushed by a background task instead of inside requests.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from datetime import datetime
+import asyncio
+import time
+import uuid
+import os
+
+from a2wsgi import WSGIMiddleware
+from flask_jwt_extended import create_access_token, decode_token
+from jwt import ExpiredSignatureError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.security import generate_password_hash, check_password_hash
+
+import warmup
+from app import (app as flask_app, _engine_options, _single_event_row, _split_events, _insert_events, _decode_binary_batch,
+                 _observe_events, _flush_due, _check_error, _check_features, _anomaly_decision, MAX_EVENT_BATCH,
+                 CORS_ORIGINS, CORS_METHODS, CORS_HEADERS)
+from database import db, configure_sqlite, User, BehavioralProfile, Session, KeystrokeEvent, MouseEvent
+from session_cache import session_cache
+from feature_engine import feature_engine
+from profile_stats import profile_updater
+from analytics import analytics
+from event_bus import event_bus
+from ml_models import model_registry
+from metrics import stage, timed_request, requests_shed
+from logging_config import get_logger
+from alert_writer import alert_writer
+from confidence import confidence_engine
+from admission import admission
+import wire_format
+from wire_format import EventColumns
+
+log = get_logger('asgi')
+
+# Anomaly checks queue alerts on the event loop; leave every write to the writer thread
+alert_writer.inline_flush = False
+
+FLUSH_INTERVAL = float(os.getenv('ASYNC_FLUSH_SECONDS', 1))
+SESSION_COLUMNS = (Session.id, Session.user_id, Session.is_active, Session.current_confidence,
+                   Session.min_confidence, Session.anomaly_count)
+
+# Waiting ingestion requests cost no thread here, only a place in the group commit
+if 'INGEST_MAX_INFLIGHT' not in os.environ:
+    admission.max_inflight = 1000
+
+
+def _async_database_uri(uri):
+    """The async driver for the configured database (ASYNC_DATABASE_URL overrides)"""
+    if os.getenv('ASYNC_DATABASE_URL'):
+        return os.getenv('ASYNC_DATABASE_URL')
+    url = make_url(uri)
+    # Replaces an explicit sync driver too, e.g. postgresql+psycopg2
+    driver = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg'}.get(url.get_backend_name())
+    if driver is None:
+        return uri
+    return url.set(drivername=f'{url.get_backend_name()}+{driver}').render_as_string(hide_password=False)
+
+
+_uri = flask_app.config['SQLALCHEMY_DATABASE_URI']
+engine = create_async_engine(_async_database_uri(_uri), **_engine_options(_uri))
+configure_sqlite(engine.sync_engine, busy_timeout_ms=int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)))
+
+# Password hashing and model scoring; hashlib and most of sklearn release the GIL
+cpu_executor = ThreadPoolExecutor(max_workers=int(os.getenv('ASYNC_CPU_WORKERS', os.cpu_count() or 4)),
+                                  thread_name_prefix='cpu')
+
+
+async def _cpu(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, fn, *args)
+
+
+class EventWriter:
+    """
+    Writes for the async routes. Transactions run one at a time: SQLite has
+    a single writer, and connections queued on its busy handler back off in
+    sleeps of up to 100ms. Event batches that arrive while a transaction is
+    running are committed together in the next one, so under load many
+    requests share a commit.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.commits = 0
+        self.batches = 0
+        self._lock = asyncio.Lock()
+        self._pending = []
+        self._task = None
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self._lock:
+            async with self.engine.begin() as conn:
+                yield conn
+
+    async def submit(self, session_id, keystrokes, mice):
+        """Insert one request's validated rows; returns once they are committed"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((session_id, keystrokes, mice, future))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+        await future
+
+    async def _write(self, batch):
+        """Insert every request of `batch` in one transaction"""
+        rows = {KeystrokeEvent: [], MouseEvent: []}
+        counts = {}
+        async with self.transaction() as conn:
+            for session_id, keystrokes, mice, _ in batch:
+                for model, events in ((KeystrokeEvent, keystrokes), (MouseEvent, mice)):
+                    if isinstance(events, EventColumns):
+                        if events:
+                            await _insert_events(conn, model, session_id, events)
+                    else:
+                        # JSON rows from all requests go into one insert per table
+                        rows[model].extend(events)
+                counts[session_id] = counts.get(session_id, 0) + len(keystrokes) + len(mice)
+            for model, model_rows in rows.items():
+                if model_rows:
+                    await conn.execute(db.insert(model), model_rows)
+            for session_id, count in counts.items():
+                await conn.execute(db.update(Session).where(Session.id == session_id)
+                                   .values(event_count=Session.event_count + count))
+        self.commits += 1
+        self.batches += len(batch)
+
+    async def _drain(self):
+        while self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                await self._write(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    _fail(batch[0][3], e)
+                else:
+                    # One request's bad rows must not fail the others, so a
+                    # failed group is retried one request per transaction
+                    for item in batch:
+                        try:
+                            await self._write([item])
+                        except Exception as item_error:
+                            _fail(item[3], item_error)
+            for *_, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+
+def _fail(future, error):
+    if not future.done():
+        future.set_exception(error)
+
+
+event_writer = EventWriter(engine)
+
+
+async def _json(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+@lru_cache(maxsize=int(os.getenv('TOKEN_CACHE_SIZE', 100000)))
+def _decode(token):
+    # decode_token reads the secret and algorithm from the Flask config
+    with flask_app.app_context():
+        return decode_token(token)
+
+
+def _identity(request):
+    """(claims, None) for a valid access token, else (None, error response) as flask_jwt_extended answers"""
+    header = request.headers.get('authorization', '')
+    if not header.startswith('Bearer '):
+        return None, JSONResponse({'msg': 'Missing Authorization Header'}, 401)
+    try:
+        # A session sends the same token with every request, so verify its signature once
+        claims = _decode(header[len('Bearer '):])
+        if claims.get('exp') is not None and claims['exp'] <= time.time():
+            raise ExpiredSignatureError('Signature has expired')
+    except ExpiredSignatureError:
+        return None, JSONResponse({'msg': 'Token has expired'}, 401)
+    except Exception as e:
+        return None, JSONResponse({'msg': str(e)}, 422)
+    if claims.get('type') != 'access':
+        return None, JSONResponse({'msg': 'Only non-refresh tokens are allowed'}, 422)
+    return claims, None
+
+
+async def _session_id(user_id, claims):
+    """Active session id for this token, as SessionCache.resolve but without blocking the loop"""
+    hit, session_id = session_cache.cached(user_id, claims)
+    if hit:
+        return session_id
+    sid = claims.get('sid')
+    query = db.select(*SESSION_COLUMNS)
+    if sid:
+        query = query.where(Session.id == sid)
+    else:
+        # Tokens issued before sessions were embedded in the claims
+        query = query.where(Session.user_id == user_id, Session.is_active.is_(True)).order_by(Session.login_time.desc())
+    async with engine.connect() as conn:
+        session = (await conn.execute(query.limit(1))).first()
+    if session is None or not session.is_active or session.user_id != user_id:
+        return None
+    session_cache.add(session.id, user_id, for_user=not sid)
+    return session.id
+
+
+def _in_app_context(fn, *args):
+    with flask_app.app_context():
+        return fn(*args)
+
+
+def _shed_response():
+    return JSONResponse({'error': 'Too many events, retry later'}, 429, headers={'Retry-After': '1'})
+
+
+def _route(path, ingestion=False):
+    """POST route with CORS and the same request metrics as the Flask routes"""
+    def decorator(handler):
+        async def endpoint(request):
+            if request.method == 'OPTIONS':
+                return Response(status_code=204)
+            with timed_request(path, request.method) as result:
+                if ingestion and not admission.enter(path):
+                    response = _shed_response()
+                else:
+                    try:
+                        response = await handler(request)
+                    finally:
+                        if ingestion:
+                            admission.leave()
+                result['status'] = response.status_code
+                return response
+        cors = Middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_methods=CORS_METHODS, allow_headers=CORS_HEADERS)
+        ROUTES.append(Route(path, endpoint, methods=['POST', 'OPTIONS'], middleware=[cors]))
+        return handler
+    return decorator
+
+
+ROUTES = []
+
+
+# ========== AUTHENTICATION ROUTES ==========
+
+@_route('/api/auth/register')
+async def register(request):
+    data = await _json(request)
+    if not data.get('username') or not data.get('email') or not data.get('password'):
+        return JSONResponse({'error': 'Missing required fields'}, 400)
+    try:
+        async with engine.connect() as conn:
+            for column, message in ((User.username, 'Username already exists'), (User.email, 'Email already exists')):
+                field = column.key
+                if (await conn.execute(db.select(User.id).where(column == data[field]))).first():
+                    return JSONResponse({'error': message}, 409)
+        password_hash = await _cpu(generate_password_hash, data['password'])
+        user_id = str(uuid.uuid4())
+        async with event_writer.transaction() as conn:
+            await conn.execute(db.insert(User).values(id=user_id, username=data['username'], email=data['email'],
+                                                      password_hash=password_hash))
+            await conn.execute(db.insert(BehavioralProfile).values(id=str(uuid.uuid4()), user_id=user_id))
+        return JSONResponse({'message': 'User registered successfully', 'user_id': user_id, 'username': data['username']}, 201)
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, 500)
+
+
+@_route('/api/auth/login')
+async def login(request):
+    data = await _json(request)
+    if not data.get('username') or not data.get('password'):
+        return JSONResponse({'error': 'Missing credentials'}, 400)
+    async with engine.connect() as conn:
+        user = (await conn.execute(db.select(User.id, User.username, User.password_hash)
+                                   .where(User.username == data['username']))).first()
+    if not user or not await _cpu(check_password_hash, user.password_hash, data['password']):
+        return JSONResponse({'error': 'Invalid credentials'}, 401)
+    session_id, login_time = str(uuid.uuid4()), datetime.utcnow()
+    async with event_writer.transaction() as conn:
+        await conn.execute(db.insert(Session).values(id=session_id, user_id=user.id, login_time=login_time,
+                                                     last_activity=login_time))
+    with flask_app.app_context():
+        access_token = create_access_token(identity=user.id, additional_claims={'sid': session_id})
+    session_cache.invalidate(user_id=user.id)
+    session_cache.add(session_id, user.id)
+    event_bus.publish('session_started', {'session_id': session_id, 'user_id': user.id, 'login_time': login_time.isoformat()})
+    return JSONResponse({'access_token': access_token, 'user_id': user.id, 'username': user.username,
+                         'session_id': session_id, 'message': 'Login successful'}, 200)
+
+
+def _end_session(session_id, user_id):
+    """Flush a closed session's in-memory state; runs on a thread inside an app context"""
+    if session_id:
+        confidence_engine.flush(session_id)
+        confidence_engine.drop(session_id)
+        feature_engine.drop(session_id)
+    profile_updater.flush(user_id)
+
+
+@_route('/api/auth/logout')
+async def logout(request):
+    claims, error = _identity(request)
+    if error:
+        return error
+    user_id = claims['sub']
+    session_id = await _session_id(user_id, claims)
+    if session_id:
+        async with event_writer.transaction() as conn:
+            await conn.execute(db.update(Session).where(Session.id == session_id, Session.is_active.is_(True))
+                               .values(is_active=False, logout_time=datetime.utcnow()))
+        session_cache.invalidate(session_id, user_id)
+        admission.forget(session_id)
+    await run_in_threadpool(_in_app_context, _end_session, session_id, user_id)
+    if session_id:
+        event_bus.publish('session_ended', {'session_id': session_id, 'user_id': user_id})
+    return JSONResponse({'message': 'Logged out successfully'}, 200)
+
+
+# ========== BEHAVIORAL LOGGING ROUTES ==========
+
+async def _log_single_event(request, event_type, message):
+    claims, error = _identity(request)
+    if error:
+        return error
+    user_id = claims['sub']
+    session_id = await _session_id(user_id, claims)
+    if not session_id:
+        return JSONResponse({'error': 'No active session'}, 401)
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    try:
+        _, row = _single_event_row(session_id, data, event_type)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, 400)
+    if event_type == 'keystroke':
+        admitted = admission.admit(session_id, [row], [])
+    else:
+        admitted = admission.admit(session_id, [], [row])
+    if not any(admitted):
+        requests_shed.inc(request.url.path, 'rate')
+        return _shed_response()
+    try:
+        model = KeystrokeEvent if event_type == 'keystroke' else MouseEvent
+        async with event_writer.transaction() as conn:
+            result = await conn.execute(db.insert(model), row)
+            await conn.execute(db.update(Session).where(Session.id == session_id)
+                               .values(event_count=Session.event_count + 1))
+        _observe_events(user_id, session_id, **{'keystrokes' if event_type == 'keystroke' else 'mice': [row]})
+        return JSONResponse({'message': message, 'event_id': result.inserted_primary_key[0]}, 201)
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, 500)
+
+
+@_route('/api/behavioral/keystroke', ingestion=True)
+async def log_keystroke(request):
+    return await _log_single_event(request, 'keystroke', 'Keystroke logged')
+
+
+@_route('/api/behavioral/mouse', ingestion=True)
+async def log_mouse(request):
+    return await _log_single_event(request, 'mouse', 'Mouse event logged')
+
+
+@_route('/api/behavioral/events/batch', ingestion=True)
+async def log_events_batch(request):
+    claims, error = _identity(request)
+    if error:
+        return error
+    user_id = claims['sub']
+    binary = request.headers.get('content-type', '').split(';')[0].strip() == wire_format.MIMETYPE
+    if binary:
+        keystrokes, mice, error = _decode_binary_batch(await request.body())
+        if error:
+            return JSONResponse(*error)
+        total = len(keystrokes) + len(mice)
+    else:
+        events = (await _json(request)).get('events')
+        if not isinstance(events, list) or not events:
+            return JSONResponse({'error': 'events must be a non-empty list'}, 400)
+        if len(events) > MAX_EVENT_BATCH:
+            return JSONResponse({'error': f'Batch too large, max {MAX_EVENT_BATCH} events'}, 413)
+        total = len(events)
+
+    session_id = await _session_id(user_id, claims)
+    if not session_id:
+        return JSONResponse({'error': 'No active session'}, 401)
+
+    if not binary:
+        # Validate the whole batch up front so it is written all-or-nothing
+        keystrokes, mice, errors = _split_events(session_id, events)
+        if errors:
+            return JSONResponse({'error': 'Invalid events', 'details': errors[:20]}, 400)
+
+    keystrokes, mice = admission.admit(session_id, keystrokes, mice)
+    accepted = len(keystrokes) + len(mice)
+    if not accepted:
+        requests_shed.inc(request.url.path, 'rate')
+        return _shed_response()
+
+    try:
+        with stage('db'):
+            await event_writer.submit(session_id, keystrokes, mice)
+        with stage('features'):
+            _observe_events(user_id, session_id, keystrokes, mice)
+        return JSONResponse({'message': 'Events logged', 'accepted': accepted, 'shed': total - accepted}, 201)
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, 500)
+
+
+# ========== ANOMALY DETECTION ROUTES ==========
+
+def _score(user_id, schema_version, features):
+    return model_registry.get(user_id, schema_version).score(features)
+
+
+@_route('/api/anomaly/check')
+async def check_anomaly(request):
+    claims, error = _identity(request)
+    if error:
+        return error
+    user_id = claims['sub']
+    try:
+        data = await _json(request)
+        error = _check_error(data)
+        if error:
+            return JSONResponse({'error': error}, 400)
+        with stage('db'):
+            session_id = await _session_id(user_id, claims)
+            session = None
+            if session_id:
+                async with engine.connect() as conn:
+                    session = (await conn.execute(db.select(*SESSION_COLUMNS).where(Session.id == session_id))).first()
+        if not session:
+            return JSONResponse({'error': 'No active session'}, 401)
+
+        features, schema_version, feature_source = _check_features(session.id, data)
+        if features and len(features) > 0:
+            with stage('model'):
+                confidence = await _cpu(_score, user_id, schema_version, features)
+            anomaly_score = 1.0 - (confidence / 100.0)
+        else:
+            anomaly_score = data.get('anomaly_score', 0.0)
+            feature_source = 'none'
+
+        result = _anomaly_decision(session, user_id, data, anomaly_score, feature_source)
+        with stage('serialization'):
+            return JSONResponse(result, 200)
+    except Exception as e:
+        log.exception('Error in check_anomaly', extra={'user_id': user_id})
+        return JSONResponse({'error': str(e)}, 500)
+
+
+# ========== APP ==========
+
+def _flush_all():
+    confidence_engine.flush()
+    profile_updater.flush()
+    analytics.flush()
+
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        try:
+            await run_in_threadpool(_in_app_context, _flush_due)
+        except Exception:
+            log.exception('Background flush failed')
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    flusher = asyncio.create_task(_flush_loop())
+    try:
+        yield
+    finally:
+        flusher.cancel()
+        await run_in_threadpool(_in_app_context, _flush_all)
+        alert_writer.shutdown()
+        await engine.dispose()
+        cpu_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=ROUTES + [Mount('/', app=WSGIMiddleware(flask_app, workers=int(os.getenv('WEB_THREADS', 8))))],
+    lifespan=lifespan
+)
+
+warmup.warm_up()
@@ -0,0 +1,95 @@
+"""
+Roll up and purge raw behavioral events older than the retention window.
+
+Raw keystroke/mouse rows for each expired day are folded into per-session
+SessionEventRollup rows (count, sum, sum of squares, min, max per metric)
+and then deleted, one day per transaction.
+
+Usage: python compact_events.py [--retention-days 30] [--dry-run]
+"""
+from datetime import datetime, timedelta
+import argparse
+import os
+
+from app import app
+from database import db, event_day, KeystrokeEvent, MouseEvent, SessionEventRollup
+
+# Per table: the metric prefix and the columns that get aggregated
+ROLLUP_COLUMNS = {
+    KeystrokeEvent: ('keystroke', ('dwell_time', 'flight_time', 'pressure')),
+    MouseEvent: ('mouse', ('speed', 'acceleration'))
+}
+
+
+def expired_days(cutoff):
+    """Distinct day keys older than the cutoff that still hold raw events"""
+    days = set()
+    for model in ROLLUP_COLUMNS:
+        days.update(day for (day,) in db.session.query(model.day).filter(model.day < cutoff).distinct())
+    return sorted(days)
+
+
+def _merge_rollup(existing, session_id, day, metric, count, total, total_sq, min_value, max_value):
+    rollup = existing.get((session_id, metric))
+    if rollup is None:
+        rollup = SessionEventRollup(session_id=session_id, day=day, metric=metric, count=0, total=0.0, total_sq=0.0)
+        db.session.add(rollup)
+        existing[(session_id, metric)] = rollup
+    rollup.count += count or 0
+    rollup.total += total or 0.0
+    rollup.total_sq += total_sq or 0.0
+    if min_value is not None:
+        rollup.min_value = min_value if rollup.min_value is None else min(rollup.min_value, min_value)
+    if max_value is not None:
+        rollup.max_value = max_value if rollup.max_value is None else max(rollup.max_value, max_value)
+
+
+def compact_day(day):
+    """Aggregate one day's raw events into rollups and delete them; returns rows removed"""
+    # Late events for an already compacted day merge into the existing rollups
+    existing = {(r.session_id, r.metric): r for r in SessionEventRollup.query.filter_by(day=day)}
+    removed = 0
+    try:
+        for model, (prefix, columns) in ROLLUP_COLUMNS.items():
+            for session_id, count in db.session.query(model.session_id, db.func.count()).filter(
+                    model.day == day).group_by(model.session_id):
+                _merge_rollup(existing, session_id, day, f'{prefix}_events', count, None, None, None, None)
+
+            for name in columns:
+                column = getattr(model, name)
+                rows = db.session.query(
+                    model.session_id, db.func.count(column), db.func.sum(column),
+                    db.func.sum(column * column), db.func.min(column), db.func.max(column)
+                ).filter(model.day == day).group_by(model.session_id)
+                for session_id, count, total, total_sq, min_value, max_value in rows:
+                    if count:
+                        _merge_rollup(existing, session_id, day, f'{prefix}_{name}', count, total, total_sq, min_value, max_value)
+
+            removed += model.query.filter(model.day == day).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return removed
+
+
+def compact_events(retention_days, dry_run=False):
+    """Compact every day older than retention_days; returns {day: rows removed}"""
+    cutoff = event_day(datetime.utcnow() - timedelta(days=retention_days))
+    days = expired_days(cutoff)
+    if dry_run:
+        return {day: 0 for day in days}
+    return {day: compact_day(day) for day in days}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Roll up and purge expired behavioral events')
+    parser.add_argument('--retention-days', type=int, default=int(os.getenv('EVENT_RETENTION_DAYS', 30)))
+    parser.add_argument('--dry-run', action='store_true', help='only list the days that would be compacted')
+    args = parser.parse_args()
+
+    with app.app_context():
+        result = compact_events(args.retention_days, dry_run=args.dry_run)
+    for day, removed in result.items():
+        print(f"🗜️ {day}: {'would compact' if args.dry_run else f'removed {removed} raw events'}")
+    print(f"✅ Compacted {len(result)} day(s) older than {args.retention_days} days")
@@ -0,0 +1,142 @@
+from collections import OrderedDict
+from datetime import datetime
+import threading
+import time
+import os
+
+from database import db, Session
+from logging_config import get_logger
+
+log = get_logger('confidence')
+
+# Bounds and thresholds for the polling hint returned to clients
+MIN_CHECK_MS = 2000
+MAX_CHECK_MS = 30000
+STABLE_CONFIDENCE = 90.0
+WATCH_CONFIDENCE = 50.0
+# A drop of this many points since the previous check counts as falling
+FALLING_DELTA = 2.0
+
+
+class SessionConfidence:
+    """
+    Time-decayed mean of a session's per-check confidences. Every
+    observation's weight halves each `half_life` seconds, so a single noisy
+    check moves the score a little and a sustained change moves it a lot.
+    """
+
+    __slots__ = ('weighted_sum', 'weight', 'updated', 'confidence', 'min_confidence',
+                 'last_activity', 'delta')
+
+    def __init__(self, confidence=100.0, min_confidence=None, prior_weight=1.0):
+        self.weighted_sum = confidence * prior_weight
+        self.weight = prior_weight
+        self.updated = time.monotonic()
+        self.confidence = confidence
+        self.min_confidence = confidence if min_confidence is None else min(min_confidence, confidence)
+        self.last_activity = None
+        self.delta = 0.0
+
+    def observe(self, value, half_life, now=None):
+        now = time.monotonic() if now is None else now
+        decay = 0.5 ** (max(0.0, now - self.updated) / half_life)
+        self.weighted_sum = self.weighted_sum * decay + value
+        self.weight = self.weight * decay + 1.0
+        self.updated = now
+        previous = self.confidence
+        self.confidence = max(0.0, min(100.0, self.weighted_sum / self.weight))
+        self.min_confidence = min(self.min_confidence, self.confidence)
+        self.delta = self.confidence - previous
+        self.last_activity = datetime.utcnow()
+
+    def next_check_ms(self, anomalous=False):
+        """Poll again soon while confidence is falling or low, rarely while it is high and steady"""
+        if anomalous or self.delta <= -FALLING_DELTA or self.confidence <= WATCH_CONFIDENCE:
+            return MIN_CHECK_MS
+        share = min(1.0, (self.confidence - WATCH_CONFIDENCE) / (STABLE_CONFIDENCE - WATCH_CONFIDENCE))
+        return int(MIN_CHECK_MS + (MAX_CHECK_MS - MIN_CHECK_MS) * share * share)
+
+
+class ConfidenceEngine:
+    """
+    Per-session smoothed confidence kept in memory. Changes are written to
+    Session.current_confidence, min_confidence and last_activity in batches
+    every `flush_interval` seconds rather than on every check.
+    """
+
+    def __init__(self, half_life=30.0, flush_interval=10.0, max_sessions=100000):
+        self.half_life = half_life
+        self.flush_interval = flush_interval
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._dirty = {}  # session_id -> SessionConfidence changed since the last flush
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def observe(self, session, value):
+        """Fold one check's confidence (0-100) into the session; returns its SessionConfidence"""
+        with self._lock:
+            state = self._state(session)
+            state.observe(float(value), self.half_life)
+            self._dirty[session.id] = state
+            return state
+
+    def _state(self, session):
+        state = self._sessions.get(session.id)
+        if state is None:
+            # First check in this process: continue from what was last flushed
+            state = self._sessions[session.id] = SessionConfidence(
+                session.current_confidence if session.current_confidence is not None else 100.0,
+                session.min_confidence
+            )
+            while len(self._sessions) > self.max_sessions:
+                # Evicted sessions with unflushed changes stay in _dirty until written
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session.id)
+        return state
+
+    def flush_if_due(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self, session_id=None):
+        """Write dirty sessions (or just one) to the sessions table; needs an app context"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if session_id is None:
+                dirty, self._dirty = self._dirty, {}
+            else:
+                state = self._dirty.pop(session_id, None)
+                dirty = {session_id: state} if state is not None else {}
+            rows = [(sid, s.confidence, s.min_confidence, s.last_activity) for sid, s in dirty.items()]
+        if not rows:
+            return 0
+
+        try:
+            for sid, confidence, min_confidence, last_activity in rows:
+                db.session.execute(db.update(Session).where(Session.id == sid).values(
+                    current_confidence=confidence, min_confidence=min_confidence, last_activity=last_activity))
+            db.session.commit()
+            return len(rows)
+        except Exception as e:
+            db.session.rollback()
+            log.error('Confidence flush failed, keeping %d sessions dirty: %s', len(rows), e)
+            with self._lock:
+                for sid, state in dirty.items():
+                    self._dirty.setdefault(sid, state)
+            return 0
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+def instant_confidence(anomaly_score):
+    return max(0.0, 100.0 - anomaly_score * 100.0)
+
+
+# Global confidence engine
+confidence_engine = ConfidenceEngine(
+    half_life=float(os.getenv('CONFIDENCE_HALF_LIFE_SECONDS', 30)),
+    flush_interval=float(os.getenv('CONFIDENCE_FLUSH_SECONDS', 10))
+)
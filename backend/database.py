@@ -1,8 +1,28 @@
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
 from datetime import datetime
 import uuid
 db = SQLAlchemy()
+
+
+def configure_sqlite(engine, busy_timeout_ms=5000):
+    """
+    Tune SQLite for concurrent ingestion: WAL lets readers run alongside the
+    single writer, synchronous=NORMAL drops the fsync per commit (still safe
+    under WAL), and busy_timeout makes writers wait instead of failing.
+    No-op for other databases.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.close()
 class User(db.Model):
     """User account model"""
     __tablename__ = 'users'
@@ -38,6 +58,11 @@ class BehavioralProfile(db.Model):
     preferred_paths = db.Column(db.String(1000), default='')
     
     samples_collected = db.Column(db.Integer, default=0)
+    # Per-metric sample counts, needed to merge new events into the running averages
+    dwell_samples = db.Column(db.Integer, default=0)
+    flight_samples = db.Column(db.Integer, default=0)
+    typing_samples = db.Column(db.Integer, default=0)
+    mouse_samples = db.Column(db.Integer, default=0)
     model_confidence = db.Column(db.Float, default=0.0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -48,6 +73,15 @@ class BehavioralProfile(db.Model):
 class Session(db.Model):
     """Tracks active user sessions with continuous auth"""
     __tablename__ = 'sessions'
+    __table_args__ = (
+        # Fallback lookup of a user's active session when the token has no sid
+        db.Index('ix_sessions_user_id_is_active', 'user_id', 'is_active'),
+        # Keyset pagination of the admin active-sessions list
+        db.Index('ix_sessions_active_login_time', 'is_active', 'login_time', 'id'),
+        db.Index('ix_sessions_active_confidence', 'is_active', 'current_confidence', 'id'),
+        db.Index('ix_sessions_active_anomaly_count', 'is_active', 'anomaly_count', 'id'),
+        db.Index('ix_sessions_active_event_count', 'is_active', 'event_count', 'id'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
@@ -59,6 +93,8 @@ class Session(db.Model):
     current_confidence = db.Column(db.Float, default=100.0)
     min_confidence = db.Column(db.Float, default=100.0)
     anomaly_count = db.Column(db.Integer, default=0)
+    # Maintained on ingestion so the admin list never has to count raw events
+    event_count = db.Column(db.Integer, default=0, nullable=False)
     
     device_fingerprint = db.Column(db.String(255), default='')
     location_hash = db.Column(db.String(255), default='')
@@ -100,12 +136,123 @@ class BehavioralEvent(db.Model):
     
     def __repr__(self):
         return f'<BehavioralEvent type={self.event_type} anomaly={self.is_anomalous}>'
+# Event timestamps (epoch ms) outside 2000-01-01..2100-01-01 are rejected on
+# ingestion; they are client-supplied and datetime can't hold arbitrary values
+MIN_EVENT_MS = 946684800000
+MAX_EVENT_MS = 4102444800000
+
+
+def event_day(ts):
+    """Day key (yyyymmdd) used to partition the compact event tables"""
+    return ts.year * 10000 + ts.month * 100 + ts.day
+
+
+# Integer ids are far smaller than UUID strings; SQLite only autoincrements INTEGER keys
+EventId = db.BigInteger().with_variant(db.Integer, 'sqlite')
+
+
+class KeystrokeEvent(db.Model):
+    """Narrow append-only keystroke event, keyed by day for retention"""
+    __tablename__ = 'keystroke_events'
+    __table_args__ = (
+        db.Index('ix_keystroke_events_day_session', 'day', 'session_id'),
+    )
+
+    id = db.Column(EventId, primary_key=True, autoincrement=True)
+    session_id = db.Column(db.String(36), nullable=False)
+    day = db.Column(db.Integer, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+
+    dwell_time = db.Column(db.Float, nullable=True)
+    flight_time = db.Column(db.Float, nullable=True)
+    pressure = db.Column(db.Float, nullable=True)
+
+    def __repr__(self):
+        return f'<KeystrokeEvent session={self.session_id} day={self.day}>'
+
+
+class MouseEvent(db.Model):
+    """Narrow append-only mouse event, keyed by day for retention"""
+    __tablename__ = 'mouse_events'
+    __table_args__ = (
+        db.Index('ix_mouse_events_day_session', 'day', 'session_id'),
+    )
+
+    id = db.Column(EventId, primary_key=True, autoincrement=True)
+    session_id = db.Column(db.String(36), nullable=False)
+    day = db.Column(db.Integer, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+
+    x = db.Column(db.Float, nullable=True)
+    y = db.Column(db.Float, nullable=True)
+    speed = db.Column(db.Float, nullable=True)
+    acceleration = db.Column(db.Float, nullable=True)
+    click_type = db.Column(db.String(20), nullable=True)
+
+    def __repr__(self):
+        return f'<MouseEvent session={self.session_id} day={self.day}>'
+
+
+class SessionEventRollup(db.Model):
+    """Per-session, per-day aggregate of raw events removed by the retention job"""
+    __tablename__ = 'session_event_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('session_id', 'day', 'metric', name='uq_session_event_rollups'),
+    )
+
+    id = db.Column(EventId, primary_key=True, autoincrement=True)
+    session_id = db.Column(db.String(36), nullable=False, index=True)
+    day = db.Column(db.Integer, nullable=False, index=True)
+    metric = db.Column(db.String(32), nullable=False)
+
+    count = db.Column(db.Integer, default=0)
+    total = db.Column(db.Float, default=0.0)
+    total_sq = db.Column(db.Float, default=0.0)
+    min_value = db.Column(db.Float, nullable=True)
+    max_value = db.Column(db.Float, nullable=True)
+
+    def __repr__(self):
+        return f'<SessionEventRollup session={self.session_id} day={self.day} metric={self.metric}>'
+
+
+class MetricRollup(db.Model):
+    """Per-minute / per-hour aggregate of one analytics metric, maintained incrementally"""
+    __tablename__ = 'metric_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'metric', 'dimension', 'bucket', name='uq_metric_rollups'),
+        db.Index('ix_metric_rollups_series', 'metric', 'granularity', 'bucket'),
+    )
+
+    id = db.Column(EventId, primary_key=True, autoincrement=True)
+    granularity = db.Column(db.String(10), nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False)
+    metric = db.Column(db.String(64), nullable=False)
+    dimension = db.Column(db.String(64), nullable=False, default='')
+
+    count = db.Column(db.Integer, default=0)
+    total = db.Column(db.Float, default=0.0)
+    total_sq = db.Column(db.Float, default=0.0)
+    # JSON list of histogram bin counts, for metrics that report percentiles
+    histogram = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f'<MetricRollup {self.metric}[{self.dimension}] {self.granularity} {self.bucket}>'
+
+
 class AnomalyAlert(db.Model):
     """Logs anomaly detections and alerts"""
     __tablename__ = 'anomaly_alerts'
+    __table_args__ = (
+        # Keyset pagination on (created_at, id) for every triage filter
+        db.Index('ix_anomaly_alerts_created', 'created_at', 'id'),
+        db.Index('ix_anomaly_alerts_session_created', 'session_id', 'created_at', 'id'),
+        db.Index('ix_anomaly_alerts_user_created', 'user_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     session_id = db.Column(db.String(36), db.ForeignKey('sessions.id'), nullable=False)
+    # Denormalized from the session so user filters don't need a join
+    user_id = db.Column(db.String(36), nullable=True)
     
     alert_type = db.Column(db.String(100), nullable=False)
     severity = db.Column(db.String(20), nullable=False)
@@ -114,6 +261,89 @@ class AnomalyAlert(db.Model):
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     resolved = db.Column(db.Boolean, default=False)
+    resolved_at = db.Column(db.DateTime, nullable=True)
+    acknowledged = db.Column(db.Boolean, default=False)
+    acknowledged_at = db.Column(db.DateTime, nullable=True)
     
     def __repr__(self):
         return f'<AnomalyAlert {self.alert_type} severity={self.severity}>'
+
+
+# The open queue stays small while resolved alerts pile up, so the default
+# triage views get partial indexes that only cover unresolved rows
+_OPEN_ALERT = AnomalyAlert.resolved.is_(False)
+db.Index('ix_anomaly_alerts_open_created', AnomalyAlert.created_at, AnomalyAlert.id,
+         sqlite_where=_OPEN_ALERT, postgresql_where=_OPEN_ALERT)
+db.Index('ix_anomaly_alerts_open_severity', AnomalyAlert.severity, AnomalyAlert.created_at, AnomalyAlert.id,
+         sqlite_where=_OPEN_ALERT, postgresql_where=_OPEN_ALERT)
+db.Index('ix_anomaly_alerts_open_type', AnomalyAlert.alert_type, AnomalyAlert.created_at, AnomalyAlert.id,
+         sqlite_where=_OPEN_ALERT, postgresql_where=_OPEN_ALERT)
+db.Index('ix_anomaly_alerts_open_user', AnomalyAlert.user_id, AnomalyAlert.created_at, AnomalyAlert.id,
+         sqlite_where=_OPEN_ALERT, postgresql_where=_OPEN_ALERT)
+
+
+def _column_ddl(column, dialect):
+    """ADD COLUMN clause for a model column, with its scalar default so existing rows are filled"""
+    ddl = f'{dialect.identifier_preparer.quote(column.name)} {column.type.compile(dialect=dialect)}'
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        ddl += f' DEFAULT {column.type.literal_processor(dialect)(default)}'
+    if not column.nullable:
+        ddl += ' NOT NULL'
+    return ddl
+
+
+def _backfill_event_count(connection, tables):
+    """Session.event_count for sessions recorded before the column existed"""
+    counts = ' + '.join(f'(SELECT COUNT(*) FROM {t} WHERE {t}.session_id = sessions.id)'
+                        for t in ('behavioral_events', 'keystroke_events', 'mouse_events') if t in tables)
+    connection.execute(db.text(f'UPDATE sessions SET event_count = {counts or 0}'))
+
+
+def _backfill_alert_user(connection, tables):
+    """AnomalyAlert.user_id, denormalized from the alert's session"""
+    connection.execute(db.text('UPDATE anomaly_alerts SET user_id = '
+                               '(SELECT user_id FROM sessions WHERE sessions.id = anomaly_alerts.session_id)'))
+
+
+def _backfill_typing_samples(connection, tables):
+    """BehavioralProfile.typing_samples, which used to share the flight time count"""
+    connection.execute(db.text('UPDATE behavioral_profiles SET typing_samples = flight_samples'))
+
+
+# Columns whose rows need more than the column default when added to an existing table
+_BACKFILLS = {
+    ('sessions', 'event_count'): _backfill_event_count,
+    ('anomaly_alerts', 'user_id'): _backfill_alert_user,
+    ('behavioral_profiles', 'typing_samples'): _backfill_typing_samples,
+}
+
+
+def upgrade_schema(engine):
+    """
+    Bring an existing database up to the models: create_all() only creates
+    missing tables, so columns and indexes added to existing tables are
+    added here. Idempotent; returns the changes made.
+    """
+    changes = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                connection.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {_column_ddl(column, engine.dialect)}'))
+                changes.append(f'{table.name}.{column.name}')
+                backfill = _BACKFILLS.get((table.name, column.name))
+                if backfill is not None:
+                    backfill(connection, existing_tables)
+            indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+                    changes.append(index.name)
+    return changes
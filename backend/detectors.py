@@ -0,0 +1,198 @@
+"""
+Lightweight anomaly detectors stored as plain NumPy arrays (.npz).
+
+Every engine reduces a feature vector to a distance from the user's
+enrollment data. Distances are calibrated against the enrollment data
+itself: the median maps to confidence 100 and the 99th percentile to 70,
+falling linearly beyond it, so the anomaly (confidence < 30) and block
+(< 10) thresholds mean the same thing whichever engine a user has.
+Engines whose distance saturates reach 0 at their ceiling instead.
+"""
+from abc import ABC, abstractmethod
+import numpy as np
+import os
+
+EULER_GAMMA = 0.5772156649015329
+
+
+class Detector(ABC):
+    engine = None
+
+    def __init__(self, state=None):
+        self.state = state or {}
+
+    @property
+    def n_features_in_(self):
+        return int(self.state['n_features'])
+
+    def fit(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        self.state = {'n_features': np.int64(X.shape[1])}
+        self._fit(X)
+        d = self.distance(X)
+        self.state['calibration'] = np.array([np.percentile(d, 50), np.percentile(d, 99), self._ceiling(X)])
+        return self
+
+    def _ceiling(self, X):
+        """Largest distance the engine can produce"""
+        return np.inf
+
+    @abstractmethod
+    def _fit(self, X):
+        """Fill self.state from the enrollment matrix X"""
+
+    @abstractmethod
+    def distance(self, X):
+        """Distance from the enrollment data per row of X"""
+
+    def confidence(self, X):
+        """Confidence 0-100 per row of X"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        median, high, ceiling = self.state['calibration']
+        d = self.distance(X)
+        confidence = 100.0 - 30.0 * (d - median) / max(high - median, 1e-9)
+        if np.isfinite(ceiling):
+            beyond = 70.0 - 70.0 * (d - high) / max(ceiling - high, 1e-9)
+            confidence = np.where(d > high, beyond, confidence)
+        return np.clip(confidence, 0.0, 100.0)
+
+    @property
+    def nbytes(self):
+        return sum(np.asarray(v).nbytes for v in self.state.values())
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f, engine=np.array(self.engine), **self.state)
+
+    @staticmethod
+    def load(path):
+        with np.load(path, allow_pickle=False) as data:
+            state = {k: data[k] for k in data.files if k != 'engine'}
+            engine = str(data['engine'])
+        return ENGINES[engine](state)
+
+
+class ZScoreDetector(Detector):
+    """Root-mean-square of per-feature z-scores; ignores correlations, costs almost nothing"""
+
+    engine = 'zscore'
+
+    def _fit(self, X):
+        self.state['mean'] = X.mean(axis=0)
+        self.state['scale'] = np.maximum(X.std(axis=0), 1e-6)
+
+    def distance(self, X):
+        z = (X - self.state['mean']) / self.state['scale']
+        return np.sqrt(np.mean(z * z, axis=1))
+
+
+class MahalanobisDetector(Detector):
+    """Mahalanobis distance under a robust (minimum covariance determinant) estimate"""
+
+    engine = 'mahalanobis'
+
+    def _fit(self, X):
+        from sklearn.covariance import MinCovDet
+        n, k = X.shape
+        try:
+            if n <= 2 * k:
+                raise ValueError('too few samples for a robust estimate')
+            mcd = MinCovDet(random_state=42).fit(X)
+            location, covariance = mcd.location_, mcd.covariance_
+        except ValueError:
+            location, covariance = X.mean(axis=0), np.cov(X, rowvar=False).reshape(k, k)
+        # A small ridge keeps near-constant features from blowing up the inverse
+        ridge = 1e-6 * max(np.trace(covariance) / k, 1e-12)
+        self.state['location'] = location
+        self.state['precision'] = np.linalg.pinv(covariance + ridge * np.eye(k))
+
+    def distance(self, X):
+        diff = X - self.state['location']
+        return np.sqrt(np.maximum(np.einsum('ij,jk,ik->i', diff, self.state['precision'], diff), 0.0))
+
+
+def _average_path_length(n):
+    """Expected path length of an unsuccessful BST search among n points"""
+    n = np.asarray(n, dtype=np.float64)
+    result = np.zeros_like(n)
+    result[n == 2] = 1.0
+    big = n > 2
+    result[big] = 2.0 * (np.log(n[big] - 1.0) + EULER_GAMMA) - 2.0 * (n[big] - 1.0) / n[big]
+    return result
+
+
+class SmallForestDetector(Detector):
+    """
+    IsolationForest with a handful of shallow trees. The fitted trees are
+    flattened into node arrays and walked with vectorized NumPy, so neither
+    storing nor scoring goes through sklearn or pickle.
+    """
+
+    engine = 'small_forest'
+    n_estimators = 16
+    max_samples = 64
+
+    def _fit(self, X):
+        from sklearn.ensemble import IsolationForest
+        forest = IsolationForest(n_estimators=self.n_estimators, max_samples=min(self.max_samples, len(X)),
+                                 random_state=42).fit(X)
+        lefts, rights, features, thresholds, leaf_depths, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator, subspace in zip(forest.estimators_, forest.estimators_features_):
+            tree = estimator.tree_
+            leaf = tree.children_left == -1
+            # Children are stored as global node indices; leaves point at themselves
+            own = np.arange(tree.node_count) + offset
+            lefts.append(np.where(leaf, own, tree.children_left + offset))
+            rights.append(np.where(leaf, own, tree.children_right + offset))
+            features.append(np.where(leaf, 0, subspace[np.maximum(tree.feature, 0)]))
+            thresholds.append(tree.threshold)
+            leaf_depths.append(_average_path_length(tree.n_node_samples))
+            roots.append(offset)
+            offset += tree.node_count
+        self.state.update({
+            'left': np.concatenate(lefts).astype(np.int32),
+            'right': np.concatenate(rights).astype(np.int32),
+            'feature': np.concatenate(features).astype(np.int32),
+            'threshold': np.concatenate(thresholds).astype(np.float64),
+            # Expected extra depth below each node if it were a leaf
+            'leaf_depth': np.concatenate(leaf_depths),
+            'roots': np.array(roots, dtype=np.int32),
+            'max_depth': np.int64(max(e.tree_.max_depth for e in forest.estimators_)),
+            'normalizer': _average_path_length([forest.max_samples_])
+        })
+
+    def _ceiling(self, X):
+        # Scores bunch up below the forest's maximum, so confidence reaches 0
+        # at the score of a typical point pushed outside the data in one
+        # feature, but never less than one median-to-p99 span above p99
+        spread = X.max(axis=0) - X.min(axis=0) + 1.0
+        probes = np.repeat(np.median(X, axis=0)[None, :], X.shape[1], axis=0)
+        probes[np.diag_indices(X.shape[1])] = X.max(axis=0) + spread
+        d = self.distance(X)
+        median, high = np.percentile(d, 50), np.percentile(d, 99)
+        return max(float(self.distance(probes).max()), 2 * high - median)
+
+    def distance(self, X):
+        s = self.state
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(s['roots'], (len(X), len(s['roots']))).copy()
+        depth = np.zeros(nodes.shape)
+        for _ in range(int(s['max_depth'])):
+            go_left = X[rows, s['feature'][nodes]] <= s['threshold'][nodes]
+            nxt = np.where(go_left, s['left'][nodes], s['right'][nodes])
+            depth += nxt != nodes
+            nodes = nxt
+        path = (depth + s['leaf_depth'][nodes]).mean(axis=1)
+        # sklearn's anomaly score: near 1 is isolated quickly, below 0.5 is ordinary
+        return 2.0 ** (-path / s['normalizer'][0])
+
+
+ENGINES = {cls.engine: cls for cls in (ZScoreDetector, MahalanobisDetector, SmallForestDetector)}
+
+# The original joblib IsolationForest, handled by ml_models.BehavioralModel
+ISOLATION_FOREST = 'isolation_forest'
+ALL_ENGINES = (ISOLATION_FOREST,) + tuple(ENGINES)
+DEFAULT_ENGINE = os.getenv('DEFAULT_DETECTOR', ISOLATION_FOREST)
@@ -0,0 +1,94 @@
+from collections import deque
+from datetime import datetime
+import threading
+import queue
+import json
+
+
+class Subscriber:
+    """One stream client's bounded queue of pending messages"""
+
+    def __init__(self, max_queue):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def offer(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # A client this far behind is told to resync rather than blocking publishers
+            self.overflowed = True
+
+
+class EventBus:
+    """
+    In-process fan-out of admin deltas (alerts, confidence changes, session
+    start/end) to server-sent-event subscribers. Recent messages are kept so
+    a reconnecting client can resume from its Last-Event-ID.
+    """
+
+    def __init__(self, max_queue=1000, history=1000):
+        self.max_queue = max_queue
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def publish(self, event_type, data):
+        with self._lock:
+            self._seq += 1
+            message = {'id': self._seq, 'type': event_type, 'ts': datetime.utcnow().isoformat(), 'data': data}
+            self._history.append(message)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.offer(message)
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber, replaying anything newer than last_event_id"""
+        subscriber = Subscriber(self.max_queue)
+        with self._lock:
+            if last_event_id is not None:
+                oldest = self._history[0]['id'] if self._history else self._seq + 1
+                # Missed messages have aged out, or the server restarted since
+                if last_event_id + 1 < oldest or last_event_id > self._seq:
+                    subscriber.overflowed = True
+                for message in self._history:
+                    if message['id'] > last_event_id:
+                        subscriber.offer(message)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def last_id(self):
+        """Id of the newest published message; a snapshot read after this resumes from it"""
+        with self._lock:
+            return self._seq
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def stream(self, subscriber, heartbeat=15.0):
+        """Yield SSE-formatted messages for one subscriber until it disconnects"""
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                if subscriber.overflowed:
+                    yield 'event: resync\ndata: {}\n\n'
+                    return
+                try:
+                    message = subscriber.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+                    continue
+                yield f"id: {message['id']}\nevent: {message['type']}\ndata: {json.dumps(message)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+# Global admin event bus
+event_bus = EventBus()
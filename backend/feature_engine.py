@@ -0,0 +1,230 @@
+from datetime import timezone
+from collections import OrderedDict, deque
+from bisect import bisect_right
+import threading
+import math
+
+# Bump when the layout of the feature vector sent by the client changes, so
+# models trained on the old layout are never scored against new vectors
+FEATURE_SCHEMA_VERSION = 1
+
+# Feature vectors built here have a different layout from the client's
+# [wpm, dwell_avg, dwell_std], so models trained on them use their own schema
+SERVER_FEATURE_SCHEMA_VERSION = 2
+
+SERVER_FEATURE_NAMES = [
+    'wpm', 'dwell_mean', 'dwell_std', 'dwell_p50', 'dwell_p90',
+    'flight_mean', 'flight_std', 'flight_p90',
+    'mouse_speed_mean', 'mouse_speed_std', 'mouse_speed_p90',
+    'mouse_accel_mean', 'mouse_events_per_min'
+]
+
+# Gaps longer than this are pauses, not typing rhythm
+MAX_FLIGHT_MS = 2000.0
+
+
+class RollingStat:
+    """
+    Mean, std and approximate percentiles over the last `window` values.
+    Running sums and a fixed-bin histogram make every push O(1); values
+    falling out of the window are subtracted back out.
+    """
+
+    def __init__(self, window, upper, bins):
+        self.window = window
+        self.edges = [upper * (i + 1) / bins for i in range(bins - 1)]
+        self.upper = upper
+        self.hist = [0] * bins
+        self.values = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def push(self, value):
+        self.values.append(value)
+        self.total += value
+        self.total_sq += value * value
+        self.hist[bisect_right(self.edges, value)] += 1
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            self.total -= old
+            self.total_sq -= old * old
+            self.hist[bisect_right(self.edges, old)] -= 1
+
+    @property
+    def count(self):
+        return len(self.values)
+
+    def mean(self):
+        return self.total / len(self.values) if self.values else 0.0
+
+    def std(self):
+        n = len(self.values)
+        if n < 2:
+            return 0.0
+        mean = self.total / n
+        return math.sqrt(max(0.0, self.total_sq / n - mean * mean))
+
+    def percentile(self, q):
+        """Approximate percentile (0-100), resolved to the middle of a histogram bin"""
+        n = len(self.values)
+        if n == 0:
+            return 0.0
+        target = q / 100.0 * n
+        width = self.upper / len(self.hist)
+        seen = 0
+        for i, c in enumerate(self.hist):
+            seen += c
+            if seen >= target and c:
+                return min(self.upper, (i + 0.5) * width)
+        return self.upper
+
+
+class RateCounter:
+    """Events per minute over a sliding time window (amortized O(1))"""
+
+    def __init__(self, window_seconds):
+        self.window_seconds = window_seconds
+        self.times = deque()
+
+    def push(self, ts):
+        self.times.append(ts)
+        while self.times and ts - self.times[0] > self.window_seconds:
+            self.times.popleft()
+
+    def per_minute(self):
+        if len(self.times) < 2:
+            return 0.0
+        span = max(self.times[-1] - self.times[0], 1.0)
+        return len(self.times) * 60.0 / span
+
+
+class SessionFeatures:
+    """Rolling behavioral statistics for one session"""
+
+    def __init__(self, window, rate_window_seconds, snapshot_every, max_snapshots):
+        self.dwell = RollingStat(window, upper=1000.0, bins=100)
+        self.flight = RollingStat(window, upper=MAX_FLIGHT_MS, bins=100)
+        self.mouse_speed = RollingStat(window, upper=5000.0, bins=100)
+        self.mouse_accel = RollingStat(window, upper=50000.0, bins=50)
+        self.keystrokes = RateCounter(rate_window_seconds)
+        self.mouse_events = RateCounter(rate_window_seconds)
+        self.snapshot_every = snapshot_every
+        self.snapshots = deque(maxlen=max_snapshots)
+        self.since_snapshot = 0
+
+    def observe(self, event_type, ts, dwell=None, flight=None, speed=None, accel=None):
+        if event_type == 'keystroke':
+            self.keystrokes.push(ts)
+            if dwell is not None and dwell >= 0:
+                self.dwell.push(float(dwell))
+            if flight is not None and 0 <= flight <= MAX_FLIGHT_MS:
+                self.flight.push(float(flight))
+            self.since_snapshot += 1
+            if self.since_snapshot >= self.snapshot_every and self.dwell.count >= self.snapshot_every:
+                self.since_snapshot = 0
+                self.snapshots.append(self.vector())
+        elif event_type == 'mouse':
+            self.mouse_events.push(ts)
+            if speed is not None and speed >= 0:
+                self.mouse_speed.push(float(speed))
+            if accel is not None:
+                self.mouse_accel.push(abs(float(accel)))
+
+    def vector(self):
+        return [
+            round(self.keystrokes.per_minute() / 5.0, 3),
+            round(self.dwell.mean(), 3),
+            round(self.dwell.std(), 3),
+            self.dwell.percentile(50),
+            self.dwell.percentile(90),
+            round(self.flight.mean(), 3),
+            round(self.flight.std(), 3),
+            self.flight.percentile(90),
+            round(self.mouse_speed.mean(), 3),
+            round(self.mouse_speed.std(), 3),
+            self.mouse_speed.percentile(90),
+            round(self.mouse_accel.mean(), 3),
+            round(self.mouse_events.per_minute(), 3)
+        ]
+
+
+class FeatureEngine:
+    """
+    Incremental per-session feature extraction from ingested events.
+    Sessions are kept in an LRU so abandoned sessions don't accumulate.
+    State is per process; each worker sees the events it ingested.
+    """
+
+    def __init__(self, window=200, rate_window_seconds=60, min_keystrokes=20,
+                 snapshot_every=25, max_snapshots=200, max_sessions=50000):
+        self.window = window
+        self.rate_window_seconds = rate_window_seconds
+        self.min_keystrokes = min_keystrokes
+        self.snapshot_every = snapshot_every
+        self.max_snapshots = max_snapshots
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, session_id):
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = SessionFeatures(self.window, self.rate_window_seconds, self.snapshot_every, self.max_snapshots)
+            self._sessions[session_id] = state
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return state
+
+    def observe_rows(self, session_id, event_type, rows):
+        """Fold KeystrokeEvent or MouseEvent row dicts, as built for bulk insert"""
+        with self._lock:
+            state = self._state(session_id)
+            for row in rows:
+                # Row timestamps are naive UTC; .timestamp() would read them as local time
+                state.observe(
+                    event_type, row['timestamp'].replace(tzinfo=timezone.utc).timestamp(),
+                    dwell=row.get('dwell_time'), flight=row.get('flight_time'),
+                    speed=row.get('speed'), accel=row.get('acceleration')
+                )
+
+    def observe_arrays(self, session_id, event_type, seconds, columns):
+        """Fold a batch given as epoch seconds and NumPy columns (wire_format.EventColumns)"""
+        if event_type == 'keystroke':
+            names = ('dwell_time', 'flight_time')
+        else:
+            names = ('speed', 'acceleration')
+        # NaN fails the range checks in observe(); only acceleration needs it spelled out as None
+        first, second = (columns[name].tolist() for name in names)
+        if event_type == 'mouse':
+            second = [None if a != a else a for a in second]
+        with self._lock:
+            state = self._state(session_id)
+            for ts, a, b in zip(seconds.tolist(), first, second):
+                if event_type == 'keystroke':
+                    state.observe(event_type, ts, dwell=a, flight=b)
+                else:
+                    state.observe(event_type, ts, speed=a, accel=b)
+
+    def vector(self, session_id):
+        """Current feature vector, or None until enough keystrokes have been seen"""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None or state.dwell.count < self.min_keystrokes:
+                return None
+            return state.vector()
+
+    def snapshots(self, session_id):
+        """Feature vectors captured periodically during the session, for training"""
+        with self._lock:
+            state = self._sessions.get(session_id)
+            return list(state.snapshots) if state is not None else []
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+# Global feature engine
+feature_engine = FeatureEngine()
@@ -0,0 +1,38 @@
+"""
+gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is loaded and warmed up in the master, then forked into workers.
+"""
+import os
+
+from warmup import rss_bytes
+
+bind = os.getenv('BIND', '127.0.0.1:5000')
+preload_app = True
+# The admin stream, session cache and training job status are held in each
+# worker's memory; run one worker with threads unless requests are sticky
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 8))
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+
+
+def post_fork(server, worker):
+    # Pooled connections opened during warm-up must not be shared across processes
+    from app import app
+    from database import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+    server.log.info(f"Worker {worker.pid} forked, RSS {rss_bytes() / 2**20:.1f} MiB")
+
+
+def post_worker_init(worker):
+    worker.log.info(f"Worker {worker.pid} ready, RSS {rss_bytes() / 2**20:.1f} MiB")
+
+
+def worker_exit(server, worker):
+    # Write-behind alerts and profile statistics still held by this worker must reach the database
+    from alert_writer import alert_writer
+    from profile_stats import profile_updater
+    alert_writer.shutdown()
+    profile_updater.shutdown()
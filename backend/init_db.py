@@ -3,11 +3,14 @@ import sys
 sys.path.insert(0, '/Users/divyanshu23/Desktop/SentinelID/backend')
 
 from app import app, db
+from database import upgrade_schema
 
 print("🔄 Initializing database...")
 
 with app.app_context():
     db.create_all()
+    for change in upgrade_schema(db.engine):
+        print(f"🔧 Added {change}")
     print("✅ Database created successfully!")
-    print("📁 Location: instance/sentinelid.db")
+    print(f"📁 Location: {db.engine.url.render_as_string(hide_password=True)}")
 
@@ -0,0 +1,170 @@
+"""
+Non-blocking structured logging.
+
+Request threads only put records on a queue; a QueueListener thread
+formats and writes them. Messages use %-style arguments, so nothing is
+formatted unless the record survives the level check and the filters.
+Below WARNING, records can be sampled and rate limited per user so a
+busy scoring path can't flood the output.
+
+    log = get_logger('scoring')
+    log.debug('scored %s', features, extra={'user_id': user_id})
+"""
+from logging.handlers import QueueHandler, QueueListener
+from collections import OrderedDict
+import threading
+import logging
+import atexit
+import random
+import queue
+import json
+import time
+import sys
+import os
+
+ROOT = 'sentinelid'
+# Attributes every LogRecord has; anything else came in through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+def get_logger(name):
+    return logging.getLogger(f'{ROOT}.{name}')
+
+
+def _fields(record):
+    return {k: v for k, v in vars(record).items() if k not in _STANDARD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        entry.update(_fields(record))
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += ' ' + ' '.join(f'{k}={v}' for k, v in fields.items())
+        return line
+
+
+class HotPathFilter(logging.Filter):
+    """
+    Sampling and per-user rate limiting for records below WARNING.
+    Warnings and errors always pass.
+    """
+
+    def __init__(self, sample_rate=1.0, per_user=20, interval=60.0, max_users=10000):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.per_user = per_user
+        self.interval = interval
+        self.max_users = max_users
+        self.suppressed = 0
+        self._windows = OrderedDict()  # key -> [window start, count]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.suppressed += 1
+            return False
+        # Records carry the user they concern, or another key to limit on
+        key = getattr(record, 'user_id', None) or getattr(record, 'rate_key', None)
+        if key is None or not self.per_user:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                window = self._windows[key] = [now, 0]
+                self._windows.move_to_end(key)
+                while len(self._windows) > self.max_users:
+                    self._windows.popitem(last=False)
+            window[1] += 1
+            if window[1] > self.per_user:
+                self.suppressed += 1
+                return False
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Enqueue without formatting; drop rather than block when the writer falls behind"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread. Tracebacks are rendered
+        # here because the frames they reference don't outlive the request.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _State:
+    handler = None
+    listener = None
+    hot_path = None
+
+
+def _start_listener(max_queue):
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if os.getenv('LOG_FORMAT', 'text') == 'json' else TextFormatter())
+    log_queue = queue.Queue(maxsize=max_queue)
+    _State.handler.queue = log_queue
+    _State.listener = QueueListener(log_queue, output, respect_handler_level=False)
+    _State.listener.start()
+
+
+def setup_logging(level=None, max_queue=10000):
+    """Route the sentinelid loggers through the background writer; safe to call twice"""
+    if _State.handler is not None:
+        return
+    root = logging.getLogger(ROOT)
+    root.setLevel((level or os.getenv('LOG_LEVEL', 'INFO')).upper())
+    root.propagate = False
+
+    _State.hot_path = HotPathFilter(
+        sample_rate=float(os.getenv('LOG_SAMPLE_RATE', 1.0)),
+        per_user=int(os.getenv('LOG_USER_RATE_LIMIT', 20)),
+        interval=float(os.getenv('LOG_USER_RATE_INTERVAL', 60))
+    )
+    _State.handler = DroppingQueueHandler(None)
+    _State.handler.addFilter(_State.hot_path)
+    root.addHandler(_State.handler)
+    _start_listener(max_queue)
+
+    # A forked child (gunicorn worker, training process) has the queue but not
+    # the writer thread, so give it a fresh queue and listener of its own
+    os.register_at_fork(after_in_child=lambda: _start_listener(max_queue))
+    atexit.register(lambda: _State.listener.stop())
+
+
+def logging_stats():
+    return {
+        'dropped': _State.handler.dropped if _State.handler else 0,
+        'suppressed': _State.hot_path.suppressed if _State.hot_path else 0
+    }
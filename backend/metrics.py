@@ -0,0 +1,269 @@
+"""
+In-process metrics rendered in the Prometheus text format.
+
+Counters and histograms are plain locked dicts keyed by label values.
+Request handlers time their stages with `stage('db')` etc.; time spent in
+the same stage during one request is summed and observed once when the
+request ends. Collectors registered with `collect()` are called at scrape
+time for values that live elsewhere, such as cache hit counts.
+"""
+from collections import defaultdict, Counter as Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import bisect
+import time
+import sys
+import os
+
+from flask import g, request, has_request_context
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labels, key)} {value:g}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        names = self.labels + ('le',)
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), entry):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{_labels(names, key + (bound,))} {cumulative}')
+                lines.append(f'{self.name}_sum{_labels(self.labels, key)} {entry[-1]:.6f}')
+                lines.append(f'{self.name}_count{_labels(self.labels, key)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collect(self, fn):
+        """Register fn() -> [(name, type, help, value), ...], called at scrape time"""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for fn in self._collectors:
+            try:
+                samples = fn()
+            except Exception as e:
+                lines.append(f'# collector {fn.__name__} failed: {e}')
+                continue
+            for name, kind, help, value in samples:
+                lines.extend([f'# HELP {name} {help}', f'# TYPE {name} {kind}', f'{name} {value:g}'])
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+request_seconds = registry.histogram(
+    'sentinelid_request_seconds', 'Request latency by route', ('route', 'method', 'status'))
+stage_seconds = registry.histogram(
+    'sentinelid_stage_seconds', 'Time per request spent in each stage', ('route', 'stage'))
+events_ingested = registry.counter('sentinelid_events_ingested_total', 'Behavioral events stored', ('type',))
+alerts_raised = registry.counter('sentinelid_alerts_total', 'Anomaly alerts raised', ('severity',))
+decisions = registry.counter('sentinelid_decisions_total', 'Anomaly check decisions', ('action',))
+events_shed = registry.counter(
+    'sentinelid_events_shed_total', 'Behavioral events dropped by admission control', ('type', 'reason'))
+requests_shed = registry.counter(
+    'sentinelid_requests_shed_total', 'Ingestion requests rejected by admission control', ('route', 'reason'))
+
+# Stage totals of the current request outside Flask (the ASGI routes)
+_request_stages = ContextVar('metric_stages', default=None)
+
+
+@contextmanager
+def stage(name):
+    """Time a block as part of the current request's `name` stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stages = g.setdefault('metric_stages', {}) if has_request_context() else _request_stages.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + elapsed
+        else:
+            stage_seconds.observe(elapsed, '', name)
+
+
+@contextmanager
+def timed_request(route, method):
+    """
+    Request timing for handlers outside Flask, matching what init_app records.
+    Yields a dict whose 'status' the handler sets to the response status.
+    """
+    start = time.perf_counter()
+    token = _request_stages.set({})
+    result = {'status': 500}
+    try:
+        yield result
+    finally:
+        stages = _request_stages.get()
+        _request_stages.reset(token)
+        request_seconds.observe(time.perf_counter() - start, route, method, result['status'])
+        for name, elapsed in stages.items():
+            stage_seconds.observe(elapsed, route, name)
+
+
+def init_app(app):
+    """Record per-route latency and stage totals for every request"""
+
+    @app.before_request
+    def _start_timer():
+        g.metric_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop('metric_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            request_seconds.observe(time.perf_counter() - start, route, request.method, response.status_code)
+            for name, elapsed in g.pop('metric_stages', {}).items():
+                stage_seconds.observe(elapsed, route, name)
+        return response
+
+
+def hit_rate_samples(prefix, help, hits, misses):
+    total = hits + misses
+    return [
+        (f'{prefix}_hits_total', 'counter', f'{help} hits', hits),
+        (f'{prefix}_misses_total', 'counter', f'{help} misses', misses),
+        (f'{prefix}_hit_ratio', 'gauge', f'{help} hit ratio', hits / total if total else 0.0)
+    ]
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all request threads every `interval` seconds and
+    counts them in collapsed form (frame;frame;frame count), ready for
+    flamegraph tools. Off by default; switched on and off at runtime.
+    """
+
+    def __init__(self, max_stacks=5000):
+        self.max_stacks = max_stacks
+        self.interval = 0.01
+        self.samples = 0
+        self._stacks = Tally()
+        self._lock = threading.Lock()
+        self._stop = None
+
+    @property
+    def running(self):
+        return self._stop is not None
+
+    def start(self, interval=0.01):
+        with self._lock:
+            self.interval = interval
+            if self._stop is not None:
+                return
+            self._stop = threading.Event()
+            threading.Thread(target=self._run, args=(self._stop,), daemon=True, name='sampling-profiler').start()
+
+    def stop(self):
+        with self._lock:
+            if self._stop is not None:
+                self._stop.set()
+                self._stop = None
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+    def _run(self, stop):
+        me = threading.get_ident()
+        while not stop.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f'{code.co_filename.rsplit("/", 1)[-1]}:{code.co_name}')
+                    frame = frame.f_back
+                stacks.append(';'.join(reversed(frames)))
+            with self._lock:
+                self.samples += 1
+                for collapsed in stacks:
+                    if collapsed in self._stacks or len(self._stacks) < self.max_stacks:
+                        self._stacks[collapsed] += 1
+
+    def collapsed(self, limit=None):
+        with self._lock:
+            return '\n'.join(f'{s} {n}' for s, n in self._stacks.most_common(limit)) + '\n'
+
+    def status(self):
+        with self._lock:
+            return {'running': self.running, 'interval': self.interval, 'samples': self.samples, 'stacks': len(self._stacks)}
+
+
+# Global sampling profiler; PROFILER_INTERVAL_MS starts it with the process
+profiler = SamplingProfiler()
+if os.getenv('PROFILER_INTERVAL_MS'):
+    profiler.start(float(os.getenv('PROFILER_INTERVAL_MS')) / 1000.0)
@@ -1,25 +1,44 @@
 
 import numpy as np
 from sklearn.ensemble import IsolationForest
+from collections import OrderedDict, Counter
+import threading
+import time
 import joblib
 import os
+import re
+
+from feature_engine import FEATURE_SCHEMA_VERSION
+from detectors import Detector, ENGINES, ISOLATION_FOREST, ALL_ENGINES, DEFAULT_ENGINE
+from logging_config import get_logger
+
+log = get_logger('models')
+
+MODEL_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'instance', 'models')
 
 class BehavioralModel:
     """Real anomaly detection using Isolation Forest"""
     
-    def __init__(self, model_path='instance/model_baseline.joblib'):
+    engine = ISOLATION_FOREST
+    
+    def __init__(self, model_path='instance/model_baseline.joblib', load=True):
         self.model_path = model_path
         self.model = None
         self.baseline_count = 0
-        self.load_model()
+        if load:
+            self.load_model()
     
     def load_model(self):
         """Load existing model if it exists"""
         if os.path.exists(self.model_path):
             try:
+                # No mmap_mode: sklearn copies tree nodes into private memory on
+                # unpickling anyway, and the few arrays left mapped would hold
+                # hundreds of file descriptors open per model
                 self.model = joblib.load(self.model_path)
-                print(f"✅ Model loaded from {self.model_path}")
-            except:
+                log.debug('Model loaded from %s', self.model_path)
+            except Exception:
+                log.warning('Could not load model %s', self.model_path, exc_info=True)
                 self.model = None
     
     def train(self, features_list):
@@ -28,11 +47,11 @@ class BehavioralModel:
         features_list: list of feature vectors like [[wpm, dwell_avg, flight_avg], ...]
         """
         if len(features_list) < 10:
-            print(f"⚠️ Need at least 10 samples, got {len(features_list)}")
+            log.warning('Need at least 10 samples, got %d', len(features_list))
             return False
         
         X = np.array(features_list)
-        print(f"📊 Training on {len(features_list)} samples with {X.shape[1]} features")
+        log.info('Training on %d samples with %d features', len(features_list), X.shape[1])
         
         self.model = IsolationForest(
             contamination=0.1,  # Expect 10% anomalies
@@ -41,10 +60,13 @@ class BehavioralModel:
         )
         self.model.fit(X)
         
-        # Save the model
+        # Save the model to a temp file and rename it into place, so readers
+        # never load a half-written joblib file
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-        joblib.dump(self.model, self.model_path)
-        print(f"✅ Model trained and saved to {self.model_path}")
+        tmp_path = f'{self.model_path}.{os.getpid()}.tmp'
+        joblib.dump(self.model, tmp_path)
+        os.replace(tmp_path, self.model_path)
+        log.info('Model trained and saved to %s', self.model_path)
         return True
     
     def score(self, feature_vector):
@@ -56,7 +78,7 @@ class BehavioralModel:
         - Low confidence (<50): Highly suspicious
         """
         if self.model is None:
-            print("⚠️ Model not trained yet, returning default confidence")
+            log.debug('Model not trained yet, returning default confidence', extra={'rate_key': self.model_path})
             return 85.0
         
         try:
@@ -65,11 +87,279 @@ class BehavioralModel:
             anomaly_score = -self.model.decision_function(X)[0]
             # Convert to confidence: higher anomaly = lower confidence
             confidence = max(0, 100 - (anomaly_score * 100))
-            return round(confidence, 2)
+            return round(float(confidence), 2)
         except Exception as e:
-            print(f"❌ Error scoring: {e}")
+            log.error('Error scoring: %s', e)
             return 85.0
+    
+    def score_batch(self, matrix):
+        """
+        Score many feature vectors in one decision_function call
+        matrix: 2-D array-like, one feature vector per row
+        Returns a NumPy array of confidence scores (0-100), one per row
+        """
+        X = np.asarray(matrix, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.model is None:
+            return np.full(len(X), 85.0)
+        
+        try:
+            anomaly_scores = -self.model.decision_function(X)
+            return np.round(np.maximum(0, 100 - (anomaly_scores * 100)), 2)
+        except Exception as e:
+            log.error('Error batch scoring: %s', e)
+            return np.full(len(X), 85.0)
+
+
+class DetectorModel:
+    """BehavioralModel counterpart for the NumPy detector engines (zscore, mahalanobis, small_forest)"""
+
+    def __init__(self, model_path, engine, load=True):
+        self.model_path = model_path
+        self.engine = engine
+        self.model = None
+        if load:
+            self.load_model()
+
+    def load_model(self):
+        if os.path.exists(self.model_path):
+            try:
+                self.model = Detector.load(self.model_path)
+                log.debug('Model loaded from %s', self.model_path)
+            except Exception:
+                log.warning('Could not load model %s', self.model_path, exc_info=True)
+                self.model = None
+
+    def train(self, features_list):
+        if len(features_list) < 10:
+            log.warning('Need at least 10 samples, got %d', len(features_list))
+            return False
+        X = np.array(features_list, dtype=float)
+        log.info('Training %s on %d samples with %d features', self.engine, len(features_list), X.shape[1])
+        self.model = ENGINES[self.engine]().fit(X)
+        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
+        tmp_path = f'{self.model_path}.{os.getpid()}.tmp'
+        self.model.save(tmp_path)
+        os.replace(tmp_path, self.model_path)
+        log.info('Model trained and saved to %s', self.model_path)
+        return True
+
+    def score(self, feature_vector):
+        """Confidence score (0-100) for one feature vector, as BehavioralModel.score"""
+        return round(float(self.score_batch([feature_vector])[0]), 2)
+
+    def score_batch(self, matrix):
+        X = np.asarray(matrix, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.model is None:
+            log.debug('Model not trained yet, returning default confidence', extra={'rate_key': self.model_path})
+            return np.full(len(X), 85.0)
+        try:
+            return np.round(self.model.confidence(X), 2)
+        except Exception as e:
+            log.error('Error batch scoring: %s', e)
+            return np.full(len(X), 85.0)
+
+
+def open_model(model_path, engine=ISOLATION_FOREST, load=True):
+    """The model class that handles `engine`"""
+    if engine == ISOLATION_FOREST:
+        return BehavioralModel(model_path, load=load)
+    return DetectorModel(model_path, engine, load=load)
+
+
+def train_model_file(features_list, model_path, engine=ISOLATION_FOREST):
+    """Fit a model and write it to model_path; runs inside a training worker process and returns the fit time"""
+    start = time.perf_counter()
+    model = open_model(model_path, engine, load=False)
+    if not model.train(features_list):
+        raise ValueError(f'Need at least 10 samples, got {len(features_list)}')
+    return time.perf_counter() - start
+
+
+class ModelRegistry:
+    """Per-user BehavioralModels, loaded lazily from disk and kept in a bounded LRU"""
+
+    _SAFE_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+
+    def __init__(self, model_dir=MODEL_DIR, max_models=512, max_bytes=256 * 1024 * 1024, recheck_interval=5.0):
+        self.model_dir = model_dir
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        # Other worker processes may retrain a model; cached entries re-stat
+        # their file at most this often and reload when it has been replaced
+        self.recheck_interval = recheck_interval
+        self._models = OrderedDict()  # (user_id, schema_version) -> [BehavioralModel, size, mtime, checked_at]
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def model_path(self, user_id, schema_version=FEATURE_SCHEMA_VERSION, engine=ISOLATION_FOREST):
+        """Path of the file holding a user's model for one engine"""
+        user_id = str(user_id)
+        if not self._SAFE_ID.match(user_id):
+            raise ValueError(f'Invalid user id for model path: {user_id!r}')
+        if engine == ISOLATION_FOREST:
+            return os.path.join(self.model_dir, f'{user_id}.v{schema_version}.joblib')
+        if engine not in ENGINES:
+            raise ValueError(f'Unknown detector engine {engine!r}')
+        return os.path.join(self.model_dir, f'{user_id}.v{schema_version}.{engine}.npz')
+
+    def trained_engine(self, user_id, schema_version=FEATURE_SCHEMA_VERSION):
+        """The engine of the user's newest model file, or None if untrained"""
+        newest, newest_written = None, None
+        for engine in ALL_ENGINES:
+            written = _mtime(self.model_path(user_id, schema_version, engine))
+            if written is not None and (newest_written is None or written > newest_written):
+                newest, newest_written = engine, written
+        return newest
+
+    def activate(self, user_id, schema_version, engine):
+        """
+        Make a freshly trained engine the user's model, removing files of other
+        engines written before it. A file written later belongs to a newer
+        training job, possibly in another process, and is left for that job.
+        """
+        written = _mtime(self.model_path(user_id, schema_version, engine))
+        if written is not None:
+            for other in ALL_ENGINES:
+                other_written = _mtime(self.model_path(user_id, schema_version, other))
+                if other != engine and other_written is not None and other_written < written:
+                    try:
+                        os.remove(self.model_path(user_id, schema_version, other))
+                    except OSError:
+                        pass
+        return self.reload(user_id, schema_version)
+
+    def get(self, user_id, schema_version=FEATURE_SCHEMA_VERSION):
+        """
+        Return the user's model, loading it from disk on first use.
+        Untrained users get a model with model=None and are not cached,
+        so they never push trained models out of the LRU.
+        """
+        key = (str(user_id), schema_version)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                if time.monotonic() - entry[3] < self.recheck_interval:
+                    return entry[0]
+                entry[3] = time.monotonic()
+            else:
+                self.misses += 1
+
+        if entry is not None:
+            if _mtime(entry[0].model_path) == entry[2]:
+                return entry[0]
+            return self.reload(user_id, schema_version)
+
+        # Load outside the lock so a slow disk read doesn't stall other users
+        engine = self.trained_engine(user_id, schema_version) or DEFAULT_ENGINE
+        model = open_model(self.model_path(user_id, schema_version, engine), engine)
+        if model.model is not None:
+            self._put(key, model)
+        return model
+
+    def train(self, user_id, features_list, schema_version=FEATURE_SCHEMA_VERSION, engine=ISOLATION_FOREST):
+        """Train and persist a user's model, replacing any cached copy"""
+        model = open_model(self.model_path(user_id, schema_version, engine), engine, load=False)
+        if not model.train(features_list):
+            return False
+        self.activate(user_id, schema_version, engine)
+        return True
+
+    def reload(self, user_id, schema_version=FEATURE_SCHEMA_VERSION):
+        """Load a freshly written model file and swap it into the cache"""
+        engine = self.trained_engine(user_id, schema_version) or DEFAULT_ENGINE
+        model = open_model(self.model_path(user_id, schema_version, engine), engine)
+        if model.model is not None:
+            self._put((str(user_id), schema_version), model)
+        else:
+            self.evict(user_id, schema_version)
+        return model
+
+    def warm(self, limit=None):
+        """Load the most recently trained models from disk, up to the cache bounds; returns how many"""
+        pattern = re.compile(r'^([A-Za-z0-9_-]+)\.v(\d+)\.(?:joblib|[a-z_]+\.npz)$')
+        try:
+            names = [n for n in os.listdir(self.model_dir) if pattern.match(n)]
+        except OSError:
+            return 0
+        names.sort(key=lambda n: _mtime(os.path.join(self.model_dir, n)) or 0, reverse=True)
+        loaded = []
+        for name in names[:min(limit or self.max_models, self.max_models)]:
+            user_id, schema_version = pattern.match(name).groups()
+            model = self.get(user_id, int(schema_version))
+            if model.model is not None:
+                loaded.append(model)
+            if self._bytes >= self.max_bytes:
+                break
+        if loaded:
+            # The first decision_function call pays for sklearn's lazy setup
+            loaded[0].score_batch(np.zeros((1, loaded[0].model.n_features_in_)))
+        return len(loaded)
+
+    def is_trained(self, user_id, schema_version=FEATURE_SCHEMA_VERSION):
+        key = (str(user_id), schema_version)
+        with self._lock:
+            if key in self._models:
+                return True
+        return self.trained_engine(user_id, schema_version) is not None
+
+    def evict(self, user_id, schema_version=FEATURE_SCHEMA_VERSION):
+        """Drop a user's model from memory (the file on disk is kept)"""
+        with self._lock:
+            entry = self._models.pop((str(user_id), schema_version), None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'resident_models': len(self._models),
+                'resident_bytes': self._bytes,
+                'max_models': self.max_models,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'engines': dict(Counter(entry[0].engine for entry in self._models.values()))
+            }
+
+    def _put(self, key, model):
+        # The on-disk model size is a cheap, stable proxy for resident size
+        try:
+            st = os.stat(model.model_path)
+            size, mtime = st.st_size, st.st_mtime_ns
+        except OSError:
+            size, mtime = 0, None
+        with self._lock:
+            old = self._models.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._models[key] = [model, size, mtime, time.monotonic()]
+            self._bytes += size
+            # Evict least recently used models, always keeping the newest one
+            while len(self._models) > 1 and (len(self._models) > self.max_models or self._bytes > self.max_bytes):
+                _, evicted = self._models.popitem(last=False)
+                self._bytes -= evicted[1]
+                self.evictions += 1
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
 
-# Global model instance
-behavioral_model = BehavioralModel()
 
+# Global registry instance
+model_registry = ModelRegistry(
+    max_models=int(os.getenv('MODEL_CACHE_MAX_MODELS', 512)),
+    max_bytes=int(os.getenv('MODEL_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+)
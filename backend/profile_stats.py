@@ -0,0 +1,231 @@
+import threading
+import atexit
+import time
+import math
+import os
+
+import numpy as np
+
+from database import db, BehavioralProfile
+from feature_engine import MAX_FLIGHT_MS
+from logging_config import get_logger
+
+log = get_logger('profiles')
+
+
+class RunningStat:
+    """Welford running mean/variance that can be merged with other partial results"""
+
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def push(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """Chan et al. parallel combination of two partial results"""
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    @classmethod
+    def of(cls, values):
+        """Partial result for an array of values"""
+        n = len(values)
+        if not n:
+            return cls()
+        mean = float(values.sum()) / n
+        deviation = values - mean
+        return cls(n, mean, float(deviation @ deviation))
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.n) if self.n else 0.0
+
+    @classmethod
+    def from_stored(cls, n, mean, std=0.0):
+        n = n or 0
+        return cls(n, mean or 0.0, (std or 0.0) ** 2 * n)
+
+
+class PendingProfile:
+    """Statistics accumulated for one user since the last flush"""
+
+    def __init__(self):
+        self.events = 0
+        self.dwell = RunningStat()
+        self.flight = RunningStat()
+        self.typing_speed = RunningStat()
+        self.mouse_speed = RunningStat()
+        self.acceleration = RunningStat()
+
+    def observe(self, event_type, dwell=None, flight=None, speed=None, accel=None):
+        self.events += 1
+        if event_type == 'keystroke':
+            if dwell is not None and dwell >= 0:
+                self.dwell.push(float(dwell))
+            if flight is not None and 0 <= flight <= MAX_FLIGHT_MS:
+                self.flight.push(float(flight))
+                # One key every (dwell + flight) ms, five keys per word
+                interval = flight + (dwell or 0)
+                if interval > 0:
+                    self.typing_speed.push(12000.0 / interval)
+        elif event_type == 'mouse':
+            if speed is not None and speed >= 0:
+                self.mouse_speed.push(float(speed))
+                self.acceleration.push(abs(float(accel or 0.0)))
+
+    def observe_arrays(self, event_type, columns):
+        """observe() for whole columns at once; NaN marks a missing value"""
+        if event_type == 'keystroke':
+            dwell, flight = columns['dwell_time'], columns['flight_time']
+            self.events += len(dwell)
+            self.dwell.merge(RunningStat.of(dwell[dwell >= 0]))
+            typed = (flight >= 0) & (flight <= MAX_FLIGHT_MS)
+            self.flight.merge(RunningStat.of(flight[typed]))
+            interval = flight[typed] + np.nan_to_num(dwell[typed])
+            self.typing_speed.merge(RunningStat.of(12000.0 / interval[interval > 0]))
+        elif event_type == 'mouse':
+            speed = columns['speed']
+            self.events += len(speed)
+            moved = speed >= 0
+            self.mouse_speed.merge(RunningStat.of(speed[moved]))
+            self.acceleration.merge(RunningStat.of(np.abs(np.nan_to_num(columns['acceleration'][moved]))))
+
+    def merge(self, other):
+        self.events += other.events
+        for name in ('dwell', 'flight', 'typing_speed', 'mouse_speed', 'acceleration'):
+            getattr(self, name).merge(getattr(other, name))
+
+
+class ProfileUpdater:
+    """
+    Keeps BehavioralProfile baselines current from ingested events.
+    Events are folded into per-user accumulators in memory and merged into
+    the profile rows every `flush_interval` seconds, so no aggregation query
+    over the raw event tables is ever needed. Pending statistics are flushed
+    at interpreter exit.
+    """
+
+    def __init__(self, flush_interval=30.0):
+        self.flush_interval = flush_interval
+        self.app = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self.shutdown)
+
+    def observe_rows(self, user_id, event_type, rows):
+        """Fold KeystrokeEvent or MouseEvent row dicts, as built for bulk insert"""
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending is None:
+                pending = self._pending[user_id] = PendingProfile()
+            for row in rows:
+                pending.observe(
+                    event_type, dwell=row.get('dwell_time'), flight=row.get('flight_time'),
+                    speed=row.get('speed'), accel=row.get('acceleration')
+                )
+
+    def observe_arrays(self, user_id, event_type, columns):
+        """Fold a batch given as NumPy columns (wire_format.EventColumns.columns)"""
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending is None:
+                pending = self._pending[user_id] = PendingProfile()
+            pending.observe_arrays(event_type, columns)
+
+    def flush_if_due(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self, user_id=None):
+        """Merge pending statistics into the profile rows; needs an app context"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if user_id is None:
+                batch, self._pending = self._pending, {}
+            else:
+                pending = self._pending.pop(user_id, None)
+                batch = {user_id: pending} if pending is not None else {}
+        if not batch:
+            return 0
+
+        try:
+            profiles = {p.user_id: p for p in BehavioralProfile.query.filter(
+                BehavioralProfile.user_id.in_(list(batch))).with_for_update()}
+            for uid, pending in batch.items():
+                profile = profiles.get(uid)
+                if profile is None:
+                    profile = BehavioralProfile(user_id=uid)
+                    db.session.add(profile)
+                _merge_into_profile(profile, pending)
+            db.session.commit()
+            return len(batch)
+        except Exception as e:
+            db.session.rollback()
+            log.error('Profile flush failed, keeping %d pending updates: %s', len(batch), e)
+            # Put the batch back so nothing is lost; it merges with newer events
+            with self._lock:
+                for uid, pending in batch.items():
+                    current = self._pending.get(uid)
+                    if current is not None:
+                        pending.merge(current)
+                    self._pending[uid] = pending
+            return 0
+
+    def shutdown(self):
+        """Flush whatever is pending; called at exit and from server shutdown hooks"""
+        if self.app is None:
+            return
+        try:
+            with self.app.app_context():
+                flushed = self.flush()
+            if flushed:
+                log.info('Flushed pending profile statistics for %d users on shutdown', flushed)
+        except Exception:
+            log.exception('Could not flush pending profile statistics on shutdown')
+
+
+def _merge_into_profile(profile, pending):
+    dwell = RunningStat.from_stored(profile.dwell_samples, profile.avg_dwell_time, profile.typing_std_dev)
+    dwell.merge(pending.dwell)
+    flight = RunningStat.from_stored(profile.flight_samples, profile.avg_flight_time)
+    flight.merge(pending.flight)
+    typing_speed = RunningStat.from_stored(profile.typing_samples, profile.avg_typing_speed)
+    typing_speed.merge(pending.typing_speed)
+    mouse_speed = RunningStat.from_stored(profile.mouse_samples, profile.avg_mouse_speed, profile.mouse_std_dev)
+    mouse_speed.merge(pending.mouse_speed)
+    acceleration = RunningStat.from_stored(profile.mouse_samples, profile.avg_acceleration)
+    acceleration.merge(pending.acceleration)
+
+    profile.avg_dwell_time = dwell.mean
+    profile.typing_std_dev = dwell.std
+    profile.dwell_samples = dwell.n
+    profile.avg_flight_time = flight.mean
+    profile.flight_samples = flight.n
+    profile.avg_typing_speed = typing_speed.mean
+    profile.typing_samples = typing_speed.n
+    profile.avg_mouse_speed = mouse_speed.mean
+    profile.mouse_std_dev = mouse_speed.std
+    profile.avg_acceleration = acceleration.mean
+    profile.mouse_samples = mouse_speed.n
+    profile.samples_collected = (profile.samples_collected or 0) + pending.events
+
+
+# Global profile updater
+profile_updater = ProfileUpdater(flush_interval=float(os.getenv('PROFILE_FLUSH_SECONDS', 30)))
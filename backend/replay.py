@@ -0,0 +1,326 @@
+"""
+Replay historical sessions through the current models and report which
+alerts and BLOCK decisions would have fired under other thresholds.
+
+The sessions table is paged by id and handed to a process pool in chunks.
+Each worker reads one session's keystroke and mouse events at a time
+(through the (day, session_id) index, plus legacy behavioral_events rows),
+merges them in timestamp order, rebuilds the server feature windows with
+feature_engine.SessionFeatures and scores them with the user's model in one
+score_batch call. Only anomaly scores come back to the parent, so memory
+stays flat however many events are replayed. Sessions of users without a
+trained server-feature model are skipped without reading their events.
+
+Live alerts in anomaly_alerts for the same sessions are counted alongside;
+they include checks scored on client-sent features, so the comparison is
+indicative rather than exact.
+
+Usage: python replay.py [--thresholds 0.6,0.7,0.8] [--block-thresholds 0.9,0.95] [--workers N] [--chunk-size 200] [--since 2024-01-01] [--until 2024-02-01] [--user USER_ID] [--model-dir DIR] [--json]
+"""
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from datetime import datetime, timedelta
+import argparse
+import json
+import time
+import os
+
+import numpy as np
+import sqlalchemy as sa
+
+from app import app, ANOMALY_THRESHOLD, BLOCK_THRESHOLD
+from database import db, event_day, Session, BehavioralEvent, KeystrokeEvent, MouseEvent, AnomalyAlert
+from feature_engine import feature_engine, SessionFeatures, SERVER_FEATURE_SCHEMA_VERSION
+from ml_models import ModelRegistry, MODEL_DIR
+
+KEYSTROKES = KeystrokeEvent.__table__
+MICE = MouseEvent.__table__
+LEGACY = BehavioralEvent.__table__
+ALERTS = AnomalyAlert.__table__
+
+# Window scores are binned at 0.01 so percentiles come from a fixed-size histogram
+SCORE_BINS = np.linspace(-1.0, 1.0, 201)
+
+
+class _Worker:
+    """Per-process state set up by _init_worker"""
+    engine = None
+    models = None
+    every = None
+    days = ()
+    legacy = False
+
+
+def _init_worker(database_uri, model_dir, every, days, legacy):
+    # Forked workers must not share the parent's pooled connections
+    _Worker.engine = sa.create_engine(database_uri, poolclass=sa.pool.NullPool)
+    _Worker.models = ModelRegistry(model_dir=model_dir, max_models=64)
+    _Worker.every = every
+    _Worker.days = days
+    _Worker.legacy = legacy
+
+
+def _timestamp(column):
+    # SQLite stores DateTime as ISO text; NumPy parses it far faster than SQLAlchemy's datetime processor
+    return sa.type_coerce(column, sa.String) if _Worker.engine.dialect.name == 'sqlite' else column
+
+
+def _session_events(conn, session_id, first_day):
+    """
+    (kinds, seconds, a, b) lists for one session merged in time order: kind 1
+    is a keystroke with dwell and flight time, 2 a mouse event with speed
+    and acceleration, NaN where a value is missing.
+    """
+    days = [d for d in _Worker.days if d >= first_day]
+    queries = []
+    if days:
+        queries.append((1, sa.select(_timestamp(KEYSTROKES.c.timestamp), KEYSTROKES.c.dwell_time, KEYSTROKES.c.flight_time)
+                        .where(KEYSTROKES.c.day.in_(days), KEYSTROKES.c.session_id == session_id)))
+        queries.append((2, sa.select(_timestamp(MICE.c.timestamp), MICE.c.speed, MICE.c.acceleration)
+                        .where(MICE.c.day.in_(days), MICE.c.session_id == session_id)))
+    if _Worker.legacy:
+        for kind, event_type, a, b in ((1, 'keystroke', LEGACY.c.keystroke_dwell_time, LEGACY.c.keystroke_flight_time),
+                                       (2, 'mouse', LEGACY.c.mouse_speed, LEGACY.c.mouse_acceleration)):
+            queries.append((kind, sa.select(_timestamp(LEGACY.c.timestamp), a, b).where(
+                LEGACY.c.session_id == session_id, LEGACY.c.event_type == event_type, LEGACY.c.timestamp.is_not(None))))
+
+    kinds, stamps, values = [np.empty(0, np.int8)], [np.empty(0, 'datetime64[us]')], [np.empty((0, 2))]
+    for kind, query in queries:
+        rows = conn.execute(query).all()
+        if not rows:
+            continue
+        ts, a, b = ([row[i] for row in rows] for i in range(3))
+        kinds.append(np.full(len(rows), kind, dtype=np.int8))
+        stamps.append(np.array(ts, dtype='datetime64[us]'))
+        values.append(np.array((a, b), dtype=float).T)
+    kinds, stamps, values = np.concatenate(kinds), np.concatenate(stamps), np.concatenate(values)
+    # Stable, so a keystroke and a mouse event at the same instant keep their stored order
+    order = np.argsort(stamps, kind='stable')
+    seconds = stamps[order].astype(np.int64) / 1e6
+    values = values[order]
+    return kinds[order].tolist(), seconds.tolist(), values[:, 0].tolist(), values[:, 1].tolist()
+
+
+def _session_windows(kinds, seconds, first, second):
+    """Feature windows the live feature engine would have snapshotted for these events"""
+    state = SessionFeatures(feature_engine.window, feature_engine.rate_window_seconds, _Worker.every, None)
+    observe = state.observe
+    for kind, ts, a, b in zip(kinds, seconds, first, second):
+        # NaN fails observe()'s range checks; only acceleration needs it spelled out as None
+        if kind == 1:
+            observe('keystroke', ts, dwell=a, flight=b)
+        else:
+            observe('mouse', ts, speed=a, accel=None if b != b else b)
+    return list(state.snapshots)
+
+
+def replay_sessions(sessions):
+    """
+    Rebuild and score the windows of (session_id, user_id, first_day) tuples;
+    runs inside a replay worker process. Returns one (session_id, user_id,
+    events, anomaly scores or None if the user has no model, live alerts,
+    live alerts above BLOCK_THRESHOLD) tuple per session.
+    """
+    results = []
+    with _Worker.engine.connect() as conn:
+        live = {}
+        for session_id, alerts, blocks in conn.execute(sa.select(
+                ALERTS.c.session_id, sa.func.count(),
+                sa.func.sum(sa.case((ALERTS.c.anomaly_score > BLOCK_THRESHOLD, 1), else_=0))
+        ).where(ALERTS.c.session_id.in_([s[0] for s in sessions])).group_by(ALERTS.c.session_id)):
+            live[session_id] = (alerts, int(blocks or 0))
+
+        for session_id, user_id, first_day in sessions:
+            alerts, blocks = live.get(session_id, (0, 0))
+            model = _Worker.models.get(user_id, SERVER_FEATURE_SCHEMA_VERSION)
+            if model.model is None:
+                results.append((session_id, user_id, 0, None, alerts, blocks))
+                continue
+            kinds, seconds, first, second = _session_events(conn, session_id, first_day)
+            windows = _session_windows(kinds, seconds, first, second)
+            scores = 1.0 - model.score_batch(windows) / 100.0 if windows else np.empty(0)
+            results.append((session_id, user_id, len(kinds), scores.astype(np.float32), alerts, blocks))
+    return results
+
+
+def event_days():
+    """Distinct day keys in the event tables, one index seek per day"""
+    days = set()
+    for table in (KEYSTROKES, MICE):
+        day = db.session.execute(sa.select(sa.func.min(table.c.day))).scalar()
+        while day is not None:
+            days.add(day)
+            day = db.session.execute(sa.select(sa.func.min(table.c.day)).where(table.c.day > day)).scalar()
+    return sorted(days)
+
+
+def session_chunks(chunk_size, since=None, until=None, user_id=None):
+    """(session_id, user_id, first_day) lists of up to chunk_size sessions, paged by id"""
+    query = sa.select(Session.id, Session.user_id, Session.login_time).order_by(Session.id).limit(chunk_size)
+    if since is not None:
+        query = query.where(Session.login_time >= since)
+    if until is not None:
+        query = query.where(Session.login_time < until)
+    if user_id is not None:
+        query = query.where(Session.user_id == user_id)
+    last_id = None
+    while True:
+        page = query if last_id is None else query.where(Session.id > last_id)
+        rows = db.session.execute(page).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        # Client timestamps may run a little behind the server's login time
+        yield [(sid, uid, event_day(login - timedelta(days=1)) if login else 0) for sid, uid, login in rows]
+
+
+class ReplayReport:
+    """Running totals of replayed sessions against each threshold"""
+
+    def __init__(self, thresholds, block_thresholds):
+        self.thresholds = np.array(sorted(thresholds))
+        self.block_thresholds = np.array(sorted(block_thresholds))
+        self.sessions = self.untrained = self.events = self.windows = 0
+        self.users = set()
+        self.histogram = np.zeros(len(SCORE_BINS) - 1, dtype=np.int64)
+        self.max_score = None
+        self.alerts = self._grid(self.thresholds)
+        self.blocks = self._grid(self.block_thresholds)
+        self.live = {'alerts': 0, 'sessions': 0, 'blocks': 0, 'blocked_sessions': 0}
+
+    @staticmethod
+    def _grid(thresholds):
+        return [{'threshold': float(t), 'windows': 0, 'sessions': 0, 'users': set(), 'live_sessions_matched': 0}
+                for t in thresholds]
+
+    def add(self, session_id, user_id, events, scores, live_alerts, live_blocks):
+        self.sessions += 1
+        self.live['alerts'] += live_alerts
+        self.live['sessions'] += bool(live_alerts)
+        self.live['blocks'] += live_blocks
+        self.live['blocked_sessions'] += bool(live_blocks)
+        if scores is None:
+            self.untrained += 1
+            return
+        self.users.add(user_id)
+        self.events += events
+        self.windows += len(scores)
+        if not len(scores):
+            return
+        self.histogram += np.histogram(np.clip(scores, SCORE_BINS[0], SCORE_BINS[-1]), SCORE_BINS)[0]
+        self.max_score = max(float(scores.max()), self.max_score if self.max_score is not None else -np.inf)
+        for grid, thresholds, live in ((self.alerts, self.thresholds, live_alerts),
+                                       (self.blocks, self.block_thresholds, live_blocks)):
+            counts = (scores[None, :] > thresholds[:, None]).sum(axis=1)
+            for row, count in zip(grid, counts.tolist()):
+                if count:
+                    row['windows'] += count
+                    row['sessions'] += 1
+                    row['users'].add(user_id)
+                    row['live_sessions_matched'] += bool(live)
+
+    def percentiles(self, qs=(50, 90, 99)):
+        """Upper bin edge below which q% of window scores fall"""
+        if not self.windows:
+            return {}
+        cumulative = np.cumsum(self.histogram)
+        result = {f'p{q}': round(float(SCORE_BINS[1 + np.searchsorted(cumulative, self.windows * q / 100.0)]), 2)
+                  for q in qs}
+        result['max'] = round(self.max_score, 3)
+        return result
+
+    def as_dict(self, seconds):
+        def rows(grid):
+            return [dict(row, users=len(row['users'])) for row in grid]
+        return {
+            'sessions': self.sessions,
+            'untrained_sessions': self.untrained,
+            'users': len(self.users),
+            'events': self.events,
+            'windows': self.windows,
+            'score_percentiles': self.percentiles(),
+            'seconds': round(seconds, 2),
+            'events_per_sec': round(self.events / seconds) if seconds else 0,
+            'alerts': rows(self.alerts),
+            'blocks': rows(self.blocks),
+            'live': self.live
+        }
+
+
+def replay(thresholds, block_thresholds, workers=None, chunk_size=200, since=None, until=None, user_id=None,
+           model_dir=MODEL_DIR, every=None):
+    """Replay every matching session and return the report as a dict"""
+    start = time.perf_counter()
+    workers = workers or os.cpu_count()
+    report = ReplayReport(thresholds, block_thresholds)
+    legacy = db.session.execute(sa.select(LEGACY.c.id).limit(1)).first() is not None
+    initargs = (app.config['SQLALCHEMY_DATABASE_URI'], model_dir, every or feature_engine.snapshot_every,
+                event_days(), legacy)
+    db.session.close()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+        # A bounded window of chunks in flight keeps the session list out of memory too
+        pending = deque()
+        for chunk in session_chunks(chunk_size, since, until, user_id):
+            pending.append(executor.submit(replay_sessions, chunk))
+            if len(pending) >= 2 * workers:
+                for result in pending.popleft().result():
+                    report.add(*result)
+        while pending:
+            for result in pending.popleft().result():
+                report.add(*result)
+    return report.as_dict(time.perf_counter() - start)
+
+
+def _floats(value):
+    return [float(v) for v in value.split(',') if v]
+
+
+def _date(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def _marker(threshold, live):
+    return ' (live)' if threshold == live else ''
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay historical sessions under alternative anomaly thresholds')
+    parser.add_argument('--thresholds', type=_floats, default=[0.6, ANOMALY_THRESHOLD, 0.8],
+                        help='comma-separated anomaly_score thresholds for an alert')
+    parser.add_argument('--block-thresholds', type=_floats, default=[BLOCK_THRESHOLD, 0.95],
+                        help='comma-separated anomaly_score thresholds for BLOCK')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='replay processes')
+    parser.add_argument('--chunk-size', type=int, default=200, help='sessions per worker task')
+    parser.add_argument('--every', type=int, default=feature_engine.snapshot_every,
+                        help='keystrokes between scored feature windows')
+    parser.add_argument('--since', type=_date, help='only sessions that logged in on or after this date')
+    parser.add_argument('--until', type=_date, help='only sessions that logged in before this date')
+    parser.add_argument('--user', help='only this user id')
+    parser.add_argument('--model-dir', default=MODEL_DIR, help='models to score with, laid out like the live model dir')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    with app.app_context():
+        result = replay(args.thresholds, args.block_thresholds, workers=args.workers, chunk_size=args.chunk_size,
+                        since=args.since, until=args.until, user_id=args.user, model_dir=args.model_dir,
+                        every=args.every)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        live = result['live']
+        print(f"🔁 Replayed {result['sessions']:,} sessions: {result['events']:,} events, {result['windows']:,} windows "
+              f"in {result['seconds']}s ({result['events_per_sec']:,} events/s)")
+        if result['score_percentiles']:
+            print('📈 Window anomaly_score ' + ', '.join(f'{k} {v}' for k, v in result['score_percentiles'].items()))
+        if result['untrained_sessions']:
+            print(f"⚠️ {result['untrained_sessions']:,} sessions skipped: user has no trained server-feature model")
+        print(f"📋 Live anomaly_alerts: {live['alerts']:,} alerts in {live['sessions']:,} sessions, "
+              f"{live['blocks']:,} above {BLOCK_THRESHOLD} in {live['blocked_sessions']:,} sessions")
+        for title, rows, current, live_sessions in (('Alerts', result['alerts'], ANOMALY_THRESHOLD, live['sessions']),
+                                                    ('BLOCK', result['blocks'], BLOCK_THRESHOLD, live['blocked_sessions'])):
+            print(f"{title} (anomaly_score > t):")
+            print(f"  {'t':<12}{'windows':>10}{'sessions':>10}{'users':>8}{'live sessions matched':>24}")
+            for r in rows:
+                print(f"  {str(r['threshold']) + _marker(r['threshold'], current):<12}{r['windows']:>10,}"
+                      f"{r['sessions']:>10,}{r['users']:>8,}{r['live_sessions_matched']:>15,} of {live_sessions:,}")
+        print("✅ Replay finished")
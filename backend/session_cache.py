@@ -0,0 +1,86 @@
+from collections import OrderedDict
+import threading
+import time
+import os
+
+from database import db, Session
+
+
+class SessionCache:
+    """
+    Resolves the caller's active session without a DB query per event.
+    Tokens carry the session id in their 'sid' claim; once a session has
+    been confirmed active it is trusted for `ttl` seconds. Logout and login
+    invalidate entries in this process, and the TTL bounds how long other
+    worker processes can keep accepting events for a closed session.
+    """
+
+    def __init__(self, ttl=60.0, max_entries=100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._sessions = OrderedDict()  # session_id -> (user_id, expires_at)
+        self._by_user = {}              # user_id -> (session_id, expires_at), for tokens without a sid; only for sids in _sessions
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, user_id, claims):
+        """(True, session id or None) if the cache can answer for this token, else (False, None)"""
+        sid = claims.get('sid')
+        with self._lock:
+            entry = self._sessions.get(sid) if sid else self._by_user.get(user_id)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    if sid and entry[0] != user_id:
+                        return True, None
+                    self.hits += 1
+                    return True, sid or entry[0]
+                self._drop(sid or entry[0])
+            self.misses += 1
+        return False, None
+
+    def resolve(self, user_id, claims):
+        """Return the active session id for this token, or None"""
+        hit, session_id = self.cached(user_id, claims)
+        if hit:
+            return session_id
+
+        sid = claims.get('sid')
+        if sid:
+            session = db.session.get(Session, sid)
+            if session is None or not session.is_active or session.user_id != user_id:
+                return None
+        else:
+            # Tokens issued before sessions were embedded in the claims
+            session = Session.query.filter_by(user_id=user_id, is_active=True).order_by(Session.login_time.desc()).first()
+            if session is None:
+                return None
+        self.add(session.id, user_id, for_user=not sid)
+        return session.id
+
+    def add(self, session_id, user_id, for_user=False):
+        """Trust a confirmed active session; for_user also answers tokens without a sid"""
+        with self._lock:
+            if for_user:
+                self._by_user[user_id] = (session_id, time.monotonic() + self.ttl)
+            self._sessions[session_id] = (user_id, time.monotonic() + self.ttl)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_entries:
+                self._drop(next(iter(self._sessions)))
+
+    def invalidate(self, session_id=None, user_id=None):
+        with self._lock:
+            if session_id is not None:
+                self._drop(session_id)
+            if user_id is not None:
+                self._by_user.pop(user_id, None)
+
+    def _drop(self, session_id):
+        """Forget a session, and its user's sid-less entry if it points there; needs the lock"""
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None and self._by_user.get(entry[0], (None,))[0] == session_id:
+            del self._by_user[entry[0]]
+
+
+# Global session cache
+session_cache = SessionCache(ttl=float(os.getenv('SESSION_CACHE_TTL', 60)))
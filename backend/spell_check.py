@@ -1,31 +1,86 @@
+from functools import lru_cache
+import string
+import gzip
+import json
+import os
+import pkgutil
 
-from spellchecker import SpellChecker
+from logging_config import get_logger
+
+
+log = get_logger('spell_check')
+
+
+def load_dictionary(language='en'):
+    """Load pyspellchecker's word list as a frozenset; shared copy-on-write by forked workers"""
+    # The resource file is not public API (see the pin in requirements.txt); reading
+    # it directly skips building SpellChecker's frequency table
+    try:
+        raw = pkgutil.get_data('spellchecker', f'resources/{language}.json.gz')
+        return frozenset(word.lower() for word in json.loads(gzip.decompress(raw).decode('utf-8')))
+    except (OSError, TypeError, ValueError) as e:
+        log.warning('pyspellchecker resource for %r unreadable (%s), using SpellChecker.word_frequency', language, e)
+        from spellchecker import SpellChecker
+        return frozenset(word.lower() for word in SpellChecker(language=language).word_frequency.keys())
+
+
+DICTIONARY = load_dictionary()
+# Longer tokens are never checked, matching SpellChecker.unknown()
+MAX_WORD_LENGTH = max(map(len, DICTIONARY)) + 3
+
+
+@lru_cache(maxsize=int(os.getenv('SPELL_CACHE_SIZE', 50000)))
+def unknown_word(word):
+    """The lowercased word if it is misspelled, else None; cached per token"""
+    if len(word) == 1 and word in string.punctuation:
+        return None
+    if len(word) > MAX_WORD_LENGTH:
+        return None
+    lowered = word.lower()
+    if lowered not in ('nan', 'inf', 'infinity'):
+        try:
+            float(word)
+            return None
+        except ValueError:
+            pass
+    return None if lowered in DICTIONARY else lowered
+
+
+def _score(text, words, misspelled):
+    # Distinct misspellings against total words, as SpellChecker.unknown() counted them
+    if not text or len(text) < 5:
+        quality = 50
+    elif len(words) == 0:
+        quality = 0
+    else:
+        quality = round((len(words) - len(misspelled)) / len(words) * 100, 2)
+    gibberish = len(words) == 0 or len(misspelled) / len(words) > 0.6
+    return {'text_quality': quality, 'is_gibberish': gibberish}
+
+
+def analyze_text(text):
+    """Spelling quality score and gibberish verdict from a single pass over the words"""
+    words = text.split() if text else []
+    misspelled = {w for w in map(unknown_word, words) if w is not None}
+    return _score(text, words, misspelled)
+
+
+def analyze_texts(texts):
+    """analyze_text for many texts, looking up each distinct token once"""
+    split = [text.split() if text else [] for text in texts]
+    verdicts = {word: unknown_word(word) for word in set().union(*split)}
+    results = []
+    for text, words in zip(texts, split):
+        misspelled = {verdicts[w] for w in words if verdicts[w] is not None}
+        results.append(_score(text, words, misspelled))
+    return results
 
-spell = SpellChecker()
 
 def check_text_quality(text):
     """Score text quality based on spelling"""
-    if not text or len(text) < 5:
-        return 50
-    
-    words = text.split()
-    if len(words) == 0:
-        return 0
-    
-    misspelled = spell.unknown(words)
-    correct_count = len(words) - len(misspelled)
-    quality_score = (correct_count / len(words)) * 100
-    
-    return round(quality_score, 2)
+    return analyze_text(text)['text_quality']
+
 
 def is_gibberish(text):
     """Check if text is random gibberish"""
-    words = text.split()
-    if len(words) == 0:
-        return True
-    
-    misspelled = spell.unknown(words)
-    gibberish_ratio = len(misspelled) / len(words)
-    
-    return gibberish_ratio > 0.6
-
+    return analyze_text(text)['is_gibberish']
@@ -0,0 +1,96 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from datetime import datetime
+import multiprocessing
+import threading
+import uuid
+import os
+
+from ml_models import model_registry, train_model_file, FEATURE_SCHEMA_VERSION, ISOLATION_FOREST
+from logging_config import get_logger
+
+log = get_logger('training')
+
+
+class TrainingQueue:
+    """Runs train_baseline fits in a process pool so requests return immediately"""
+
+    def __init__(self, max_workers=2, max_jobs=10000):
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        # Created on first use so importing this module never starts processes
+        if self._executor is None:
+            # Forking this process would copy locks held by its logging, writer
+            # and request threads into the child; the fork server has no threads
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['ml_models'])
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        return self._executor
+
+    def submit(self, user_id, features_list, schema_version=FEATURE_SCHEMA_VERSION, engine=ISOLATION_FOREST):
+        """Queue a training job and return its id"""
+        job_id = str(uuid.uuid4())
+        model_path = model_registry.model_path(user_id, schema_version, engine)
+        job = {
+            'job_id': job_id,
+            'user_id': user_id,
+            'schema_version': schema_version,
+            'engine': engine,
+            'samples': len(features_list),
+            'state': 'queued',
+            'submitted_at': datetime.utcnow(),
+            'fit_time': None,
+            'error': None,
+            'future': None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            job['future'] = self._get_executor().submit(train_model_file, features_list, model_path, engine)
+        job['future'].add_done_callback(lambda f: self._finish(job, f))
+        return job_id
+
+    def _finish(self, job, future):
+        try:
+            job['fit_time'] = round(future.result(), 3)
+            # The worker renamed the new file into place; retire older engines' files and swap it into the cache
+            model_registry.activate(job['user_id'], job['schema_version'], job['engine'])
+            job['state'] = 'done'
+        except Exception as e:
+            job['state'] = 'failed'
+            job['error'] = str(e)
+            log.error('Training job %s failed: %s', job['job_id'], e, extra={'user_id': job['user_id']})
+
+    def status(self, job_id):
+        """Return a JSON-friendly view of a job, or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        state = job['state']
+        if state == 'queued' and job['future'] is not None and job['future'].running():
+            state = 'running'
+        return {
+            'job_id': job['job_id'],
+            'user_id': job['user_id'],
+            'state': state,
+            'engine': job['engine'],
+            'samples': job['samples'],
+            'fit_time': job['fit_time'],
+            'submitted_at': job['submitted_at'].isoformat(),
+            'error': job['error']
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+# Global training queue
+training_queue = TrainingQueue(max_workers=int(os.getenv('TRAINING_WORKERS', 2)))
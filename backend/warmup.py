@@ -0,0 +1,56 @@
+"""
+Startup warm-up for preforking servers.
+
+Run once in the master before workers fork (gunicorn preload_app, see
+gunicorn.conf.py) so every worker inherits already imported libraries,
+the spell-check dictionary and the most recently used models instead of
+paying for them on its first request.
+"""
+import resource
+import time
+import os
+
+from logging_config import get_logger
+
+log = get_logger('startup')
+
+# Set when this module is first imported, i.e. early in process startup
+STARTED_AT = time.perf_counter()
+
+report = {}
+
+
+def rss_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # No procfs (e.g. macOS): fall back to the peak, reported in bytes there
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def warm_up(max_models=None):
+    """Load models and dictionaries and exercise the scoring path; returns a report"""
+    from ml_models import model_registry
+    from spell_check import analyze_text
+
+    start = time.perf_counter()
+    models = model_registry.warm(limit=max_models)
+    analyze_text('warm up the spell checker')
+
+    report.update({
+        'pid': os.getpid(),
+        'models_loaded': models,
+        'warmup_seconds': round(time.perf_counter() - start, 3),
+        'startup_seconds': round(time.perf_counter() - STARTED_AT, 3),
+        'rss_bytes': rss_bytes()
+    })
+    log.info('Warm-up: %d models in %ss, startup %ss, RSS %.1f MiB', models, report['warmup_seconds'],
+             report['startup_seconds'], report['rss_bytes'] / 2**20)
+    return report
+
+
+def process_stats():
+    """Warm-up report plus this worker's live RSS"""
+    return dict(report, pid=os.getpid(), rss_bytes=rss_bytes())
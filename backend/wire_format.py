@@ -0,0 +1,195 @@
+"""
+Packed binary upload format for behavioral event batches.
+
+All values are little-endian. An upload is an 8-byte header followed by
+one block per event type:
+
+    header  4s magic b'SIDE', u8 version, u8 block count, u16 reserved
+    block   u8 event type (1 keystroke, 2 mouse), 3 pad bytes, u32 count,
+            f64 base timestamp (epoch ms), then COLUMNS[type] as float32
+            columns of `count` values each, one column after another
+
+Timestamps are float32 millisecond offsets from the block's base and must
+fall between 2000 and 2100, NaN marks a missing value, and click_type is
+an index into CLICK_TYPES. The server maps columns straight onto NumPy
+arrays; a 50-event batch is about a fifth of its JSON size. On SQLite the
+columns are inserted as plain tuples, without a dict per event.
+"""
+from itertools import repeat
+import struct
+import time
+
+import numpy as np
+
+from database import event_day, MIN_EVENT_MS, MAX_EVENT_MS
+
+MIMETYPE = 'application/x-sentinelid-events'
+MAGIC = b'SIDE'
+VERSION = 1
+
+HEADER = struct.Struct('<4sBBH')
+BLOCK = struct.Struct('<B3xId')
+
+EVENT_CODES = {'keystroke': 1, 'mouse': 2}
+EVENT_TYPES = {code: event_type for event_type, code in EVENT_CODES.items()}
+COLUMNS = {
+    'keystroke': ('timestamp', 'dwell_time', 'flight_time', 'pressure'),
+    'mouse': ('timestamp', 'x', 'y', 'speed', 'acceleration', 'click_type')
+}
+CLICK_TYPES = ('left', 'right', 'middle')
+
+
+class TooManyEvents(ValueError):
+    pass
+
+
+class EventColumns:
+    """Events of one type as NumPy columns; len() and slicing work like a list of rows"""
+
+    def __init__(self, event_type, timestamp, columns):
+        self.event_type = event_type
+        self.timestamp = timestamp  # datetime64[us], UTC
+        self.columns = columns      # field -> float64 array, NaN where missing
+
+    @classmethod
+    def from_blocks(cls, event_type, blocks):
+        """Build from (base ms, float32 array of shape (columns, count)) blocks"""
+        names = COLUMNS[event_type][1:]
+        if not blocks:
+            return cls(event_type, np.empty(0, 'datetime64[us]'), {n: np.empty(0) for n in names})
+        if not all(MIN_EVENT_MS <= base <= MAX_EVENT_MS for base, _ in blocks):
+            raise ValueError('base timestamp out of range')
+        if len(blocks) == 1:
+            base, data = blocks[0]
+            data = data.astype(np.float64)
+            ms = data[0] + base
+        else:
+            data = np.concatenate([block for _, block in blocks], axis=1).astype(np.float64)
+            ms = data[0] + np.concatenate([np.full(block.shape[1], base) for base, block in blocks])
+        if np.isinf(data).any():
+            raise ValueError('values must be finite or NaN')
+        missing = np.isnan(ms)
+        if missing.any():
+            # Like the JSON API, events without a timestamp are stamped on arrival
+            ms[missing] = time.time() * 1000.0
+        if ((ms < MIN_EVENT_MS) | (ms > MAX_EVENT_MS)).any():
+            raise ValueError('timestamp out of range')
+        timestamp = np.round(ms * 1000.0).astype(np.int64).astype('datetime64[us]')
+        columns = dict(zip(names, data[1:]))
+        if 'click_type' in columns:
+            codes = columns['click_type'][~np.isnan(columns['click_type'])]
+            if ((codes < 0) | (codes >= len(CLICK_TYPES)) | (codes != np.floor(codes))).any():
+                raise ValueError(f'click_type must be an index into {list(CLICK_TYPES)}')
+        return cls(event_type, timestamp, columns)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, index):
+        return self.take(index)
+
+    def take(self, index):
+        """The events at a slice or an array of positions"""
+        return EventColumns(self.event_type, self.timestamp[index],
+                            {name: values[index] for name, values in self.columns.items()})
+
+    def seconds(self):
+        """Timestamps as epoch seconds"""
+        return self.timestamp.astype(np.int64) / 1e6
+
+    def days(self):
+        """The event_day() key of every event; a batch rarely spans more than one day"""
+        keys = {}
+        return [keys[d] if d in keys else keys.setdefault(d, event_day(d))
+                for d in self.timestamp.astype('datetime64[D]').tolist()]
+
+    def keys(self):
+        """Row columns in the order tuples() yields them"""
+        return ('session_id', 'day', 'timestamp', *self.columns)
+
+    def tuples(self, session_id, timestamps=None):
+        """
+        Row tuples in keys() order, with None for NaN and click_type names.
+        `timestamps` replaces the datetime column, e.g. with timestamp_strings().
+        """
+        values = []
+        for name, column in self.columns.items():
+            if name == 'click_type':
+                values.append([None if c != c else CLICK_TYPES[int(c)] for c in column.tolist()])
+            elif np.isnan(column).any():
+                values.append([None if v != v else v for v in column.tolist()])
+            else:
+                values.append(column.tolist())
+        if timestamps is None:
+            timestamps = self.timestamp.tolist()
+        return list(zip(repeat(session_id), self.days(), timestamps, *values))
+
+    def timestamp_strings(self):
+        """Timestamps in the text form SQLAlchemy stores DateTime columns in SQLite"""
+        return np.char.replace(np.datetime_as_string(self.timestamp, unit='us'), 'T', ' ').tolist()
+
+    def rows(self, session_id):
+        """KeystrokeEvent or MouseEvent row dicts for bulk insert"""
+        keys = self.keys()
+        return [dict(zip(keys, row)) for row in self.tuples(session_id)]
+
+
+def decode(body, max_events=None):
+    """
+    Parse an upload into (keystrokes, mice) EventColumns. Raises ValueError
+    for a malformed body and TooManyEvents past `max_events`.
+    """
+    if len(body) < HEADER.size:
+        raise ValueError('truncated header')
+    magic, version, block_count, _ = HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError('not a SentinelID event upload')
+    if version != VERSION:
+        raise ValueError(f'unsupported format version {version}')
+
+    blocks = {event_type: [] for event_type in COLUMNS}
+    offset, total = HEADER.size, 0
+    for _ in range(block_count):
+        if len(body) < offset + BLOCK.size:
+            raise ValueError('truncated block header')
+        code, count, base = BLOCK.unpack_from(body, offset)
+        event_type = EVENT_TYPES.get(code)
+        if event_type is None:
+            raise ValueError(f'unknown event type code {code}')
+        total += count
+        if max_events is not None and total > max_events:
+            raise TooManyEvents(f'Batch too large, max {max_events} events')
+        width = len(COLUMNS[event_type])
+        offset += BLOCK.size
+        if len(body) < offset + 4 * width * count:
+            raise ValueError('truncated block')
+        data = np.frombuffer(body, dtype='<f4', count=width * count, offset=offset).reshape(width, count)
+        blocks[event_type].append((base, data))
+        offset += 4 * width * count
+    if offset != len(body):
+        raise ValueError('unexpected bytes after the last block')
+    return EventColumns.from_blocks('keystroke', blocks['keystroke']), EventColumns.from_blocks('mouse', blocks['mouse'])
+
+
+def encode(events):
+    """Pack API-style event dicts ({'type': 'keystroke', 'timestamp': ms, ...}) into an upload"""
+    parts = []
+    for event_type, code in EVENT_CODES.items():
+        rows = [e for e in events if e.get('type') == event_type]
+        if not rows:
+            continue
+        base = rows[0].get('timestamp')
+        base = float(base) if base is not None else time.time() * 1000.0
+        data = np.full((len(COLUMNS[event_type]), len(rows)), np.nan, dtype='<f4')
+        for i, e in enumerate(rows):
+            for j, name in enumerate(COLUMNS[event_type]):
+                value = e.get(name)
+                if value is None:
+                    continue
+                if name == 'timestamp':
+                    value -= base
+                elif name == 'click_type':
+                    value = CLICK_TYPES.index(value)
+                data[j, i] = value
+        parts.append(BLOCK.pack(code, len(rows), base) + data.tobytes())
+    return HEADER.pack(MAGIC, VERSION, len(parts), 0) + b''.join(parts)
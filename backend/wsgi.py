@@ -0,0 +1,11 @@
+"""
+WSGI entry point: gunicorn -c gunicorn.conf.py wsgi:app
+
+Imported once in the gunicorn master (preload_app), so the warm-up below
+runs before workers fork and its memory is shared copy-on-write.
+"""
+import warmup
+
+from app import app
+
+warmup.warm_up()
@@ -0,0 +1,151 @@
+"""
+Alert triage latency as the anomaly_alerts table grows.
+
+The table is filled in steps up to each size in --sizes with mostly
+resolved alerts (--open-share stay open), spread over users, sessions,
+severities and types. After each step the benchmark times the triage
+queries through the API: the first page of the open queue, a page deep
+into it via the cursor, each filter, the full history, and bulk
+acknowledge/resolve. Keyset pagination over the indexes should keep every
+number flat as the table grows.
+
+Usage: python benchmarks/bench_alerts.py [--sizes 10000,100000,1000000] [--open-share 0.02] [--json]
+"""
+from datetime import datetime, timedelta
+import argparse
+import tempfile
+import shutil
+import random
+import json
+import time
+import uuid
+import sys
+import os
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+REPEATS = 20
+INSERT_BATCH = 5000
+USERS = 500
+SEVERITIES = ('medium', 'high')
+ALERT_TYPES = ('behavioral_anomaly', 'gibberish', 'velocity')
+
+
+def fill(db, AnomalyAlert, sessions, start, stop, open_share, rng):
+    """Insert alerts start..stop-1, one per second of simulated time; returns their ids"""
+    base = datetime(2025, 1, 1)
+    ids = []
+    for first in range(start, stop, INSERT_BATCH):
+        rows = []
+        for i in range(first, min(stop, first + INSERT_BATCH)):
+            session_id, user_id = sessions[i % len(sessions)]
+            resolved = rng.random() >= open_share
+            rows.append({
+                'id': str(uuid.uuid4()), 'session_id': session_id, 'user_id': user_id,
+                'alert_type': rng.choice(ALERT_TYPES), 'severity': rng.choice(SEVERITIES),
+                'description': 'Anomaly detected: synthetic', 'anomaly_score': rng.uniform(0.7, 1.0),
+                'created_at': base + timedelta(seconds=i), 'resolved': resolved, 'acknowledged': False,
+                'resolved_at': base + timedelta(seconds=i + 60) if resolved else None
+            })
+        db.session.execute(db.insert(AnomalyAlert), rows)
+        db.session.commit()
+        ids.extend(row['id'] for row in rows)
+    return ids
+
+
+def timed(fn, setup=None):
+    samples = []
+    for _ in range(REPEATS):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return round(samples[len(samples) // 2] * 1000, 3)
+
+
+def measure(app, client, sessions, size, rng):
+    def get(**params):
+        resp = client.get('/api/admin/alerts', query_string=params)
+        assert resp.status_code == 200, resp.get_json()
+        return resp.get_json()
+
+    # Walk 20 pages into the open queue to get a deep cursor
+    cursor = None
+    for _ in range(20):
+        cursor = get(limit=50, **({'cursor': cursor} if cursor else {}))['next_cursor'] or cursor
+    session_id, user_id = sessions[0]
+
+    def bulk(path, body):
+        resp = client.post(path, json=body, headers={'X-Admin-Token': os.environ['ADMIN_TOKEN']})
+        assert resp.status_code == 200, resp.get_json()
+
+    def fresh_alerts():
+        # 100 new open alerts per bulk run, inserted outside the timed section
+        from database import db, AnomalyAlert
+        with app.app_context():
+            return (fill(db, AnomalyAlert, sessions, size, size + 100, 1.0, rng),)
+
+    return {
+        'open_first_page_ms': timed(lambda: get(limit=50)),
+        'open_deep_page_ms': timed(lambda: get(limit=50, cursor=cursor)),
+        'severity_ms': timed(lambda: get(limit=50, severity='high')),
+        'alert_type_ms': timed(lambda: get(limit=50, alert_type='gibberish')),
+        'session_ms': timed(lambda: get(limit=50, session_id=session_id, status='all')),
+        'user_ms': timed(lambda: get(limit=50, user_id=user_id)),
+        'user_history_ms': timed(lambda: get(limit=50, user_id=user_id, status='all')),
+        'history_ms': timed(lambda: get(limit=50, status='all')),
+        'acknowledge_100_ms': timed(lambda ids: bulk('/api/admin/alerts/acknowledge', {'alert_ids': ids}), fresh_alerts),
+        'resolve_100_ms': timed(lambda ids: bulk('/api/admin/alerts/resolve', {'alert_ids': ids}), fresh_alerts),
+        'resolve_user_ms': timed(lambda: bulk('/api/admin/alerts/resolve', {'user_id': rng.choice(sessions)[1]}))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='comma-separated table sizes to measure at')
+    parser.add_argument('--open-share', type=float, default=0.02, help='fraction of alerts left unresolved')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results only')
+    args = parser.parse_args()
+    sizes = sorted(int(s) for s in args.sizes.split(','))
+
+    workdir = tempfile.mkdtemp(prefix='sentinelid-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ.setdefault('ADMIN_TOKEN', 'bench')
+    sys.path.insert(0, BACKEND_DIR)
+    from app import app
+    from database import db, AnomalyAlert
+
+    rng = random.Random(42)
+    # Alert rows only reference sessions by id, so no session rows are needed
+    sessions = [(str(uuid.uuid4()), str(uuid.uuid4())) for _ in range(USERS)]
+    client = app.test_client()
+    results = []
+    try:
+        filled = 0
+        for size in sizes:
+            start = time.perf_counter()
+            with app.app_context():
+                fill(db, AnomalyAlert, sessions, filled, size, args.open_share, rng)
+                db.session.execute(db.text('ANALYZE'))
+                db.session.commit()
+            fill_seconds = time.perf_counter() - start
+            filled = size
+            results.append({'rows': size, 'fill_seconds': round(fill_seconds, 1), **measure(app, client, sessions, size, rng)})
+        with app.app_context():
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({'open_share': args.open_share, 'results': results}))
+        return
+    columns = [k for k in results[0] if k.endswith('_ms')]
+    print(f"Median of {REPEATS} requests, ms ({args.open_share:.0%} of alerts open)")
+    print(f"  {'rows':>9}" + ''.join(f"{c[:-3]:>20}" for c in columns))
+    for r in results:
+        print(f"  {r['rows']:>9}" + ''.join(f"{r[c]:>20}" for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+End-to-end API latency and throughput with N concurrent simulated users.
+
+Each user registers, logs in, streams keystroke and mouse events in the
+batches the frontend sends (one upload per 2s of activity), calls
+/api/anomaly/check whenever the server's next_check_ms hint says to
+(every 5s without one) and logs out. Requests go through Flask's test
+client against a fresh SQLite database.
+
+Usage: python benchmarks/bench_api.py [--users 20] [--seconds 60] [--train] [--realtime] [--flood 0] [--json]
+
+--seconds is simulated activity per user. Without --realtime users send as
+fast as the server answers, which measures throughput; with it they pace
+themselves like real browsers, which measures latency under normal load.
+Per-session ingestion limits are off in throughput mode unless set in the
+environment.
+
+--flood N adds N misbehaving clients that upload full 500-event batches in
+a tight loop while the users run; shed events and 429s are reported. Run it
+once more with INGEST_SESSION_RATE=0 INGEST_GLOBAL_RATE=0 to see the users'
+latency without admission control.
+"""
+import threading
+import argparse
+import tempfile
+import shutil
+import random
+import json
+import time
+import uuid
+import sys
+import os
+
+import bench_common
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+FLUSH_SECONDS = 2.0
+CHECK_SECONDS = 5.0
+KEYS_PER_SECOND = 5
+MOUSE_PER_SECOND = 20
+# Enough keystrokes for the feature engine's 10 training windows
+TRAIN_AFTER_KEYSTROKES = 300
+FLOOD_BATCH_SECONDS = 20  # 500 events, the largest batch the API takes
+
+
+class Recorder(bench_common.Recorder):
+    def call(self, client, method, name, url, **kwargs):
+        start = time.perf_counter()
+        resp = getattr(client, method)(url, **kwargs)
+        self.record(name, time.perf_counter() - start, resp.status_code >= 400)
+        return resp
+
+
+def make_batch(rng, seconds, profile, now_ms):
+    events = []
+    for i in range(int(seconds * KEYS_PER_SECOND)):
+        events.append({
+            'type': 'keystroke', 'timestamp': now_ms + i * 200,
+            'dwell_time': max(10.0, rng.gauss(profile['dwell'], 15)),
+            'flight_time': max(0.0, rng.gauss(profile['flight'], 30))
+        })
+    for i in range(int(seconds * MOUSE_PER_SECOND)):
+        events.append({
+            'type': 'mouse', 'timestamp': now_ms + i * 50,
+            'x': rng.random() * 1920, 'y': rng.random() * 1080,
+            'speed': max(0.0, rng.gauss(profile['speed'], 80)), 'acceleration': rng.gauss(0, 50)
+        })
+    return events
+
+
+def simulate_user(app, recorder, index, args, barrier):
+    rng = random.Random(index)
+    client = app.test_client()
+    username = f'bench-{index}-{uuid.uuid4().hex[:8]}'
+    profile = {'dwell': rng.uniform(70, 130), 'flight': rng.uniform(90, 180), 'speed': rng.uniform(250, 550)}
+
+    barrier.wait()
+    recorder.call(client, 'post', 'register', '/api/auth/register',
+                  json={'username': username, 'email': f'{username}@bench.local', 'password': 'bench-password'})
+    login = recorder.call(client, 'post', 'login', '/api/auth/login',
+                          json={'username': username, 'password': 'bench-password'}).get_json()
+    headers = {'Authorization': f"Bearer {login['access_token']}"}
+
+    elapsed = next_check = 0.0
+    keystrokes = 0
+    trained = not args.train
+    while elapsed < args.seconds:
+        tick = time.perf_counter()
+        batch = make_batch(rng, FLUSH_SECONDS, profile, int(time.time() * 1000))
+        recorder.call(client, 'post', 'events_batch', '/api/behavioral/events/batch', headers=headers, json={'events': batch})
+        with recorder.lock:
+            recorder.events += len(batch)
+        keystrokes += int(FLUSH_SECONDS * KEYS_PER_SECOND)
+        elapsed += FLUSH_SECONDS
+
+        if not trained and keystrokes >= TRAIN_AFTER_KEYSTROKES:
+            trained = True
+            job = recorder.call(client, 'post', 'train_baseline', '/api/behavioral/train_baseline', headers=headers, json={}).get_json()
+            while job.get('job_id') and job.get('state') not in ('done', 'failed'):
+                time.sleep(0.1)
+                job = recorder.call(client, 'get', 'train_status', f"/api/behavioral/train_status/{job['job_id']}", headers=headers).get_json()
+
+        if elapsed >= next_check:
+            # No features: the server scores its own feature window for the session
+            check = recorder.call(client, 'post', 'anomaly_check', '/api/anomaly/check', headers=headers, json={})
+            # Follow the server's polling hint like the frontend does
+            next_check = elapsed + (check.get_json() or {}).get('next_check_ms', CHECK_SECONDS * 1000) / 1000.0
+
+        if args.realtime:
+            time.sleep(max(0.0, FLUSH_SECONDS - (time.perf_counter() - tick)))
+
+    recorder.call(client, 'post', 'logout', '/api/auth/logout', headers=headers)
+
+
+def flood(app, recorder, index, done, barrier):
+    """Upload maximum-size batches back to back until the users finish"""
+    rng = random.Random(-1 - index)
+    client = app.test_client()
+    username = f'flood-{index}-{uuid.uuid4().hex[:8]}'
+    profile = {'dwell': 100, 'flight': 120, 'speed': 400}
+    client.post('/api/auth/register', json={'username': username, 'email': f'{username}@bench.local', 'password': 'bench-password'})
+    login = client.post('/api/auth/login', json={'username': username, 'password': 'bench-password'}).get_json()
+    headers = {'Authorization': f"Bearer {login['access_token']}"}
+
+    barrier.wait()
+    while not done.is_set():
+        batch = make_batch(rng, FLOOD_BATCH_SECONDS, profile, int(time.time() * 1000))
+        resp = recorder.call(client, 'post', 'flood_batch', '/api/behavioral/events/batch', headers=headers, json={'events': batch})
+        shed = len(batch) if resp.status_code == 429 else (resp.get_json() or {}).get('shed', 0)
+        with recorder.lock:
+            recorder.shed += shed
+
+
+def db_size(db, path):
+    db.session.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+    db.session.commit()
+    return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=60, help='simulated activity per user')
+    parser.add_argument('--train', action='store_true', help='train each user a baseline model once enough events arrive')
+    parser.add_argument('--realtime', action='store_true', help='pace users like real browsers instead of as fast as possible')
+    parser.add_argument('--flood', type=int, default=0, help='clients uploading as fast as they can alongside the users')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results only')
+    args = parser.parse_args()
+
+    # Every simulated client gets its own thread, so there is no worker pool to reserve
+    os.environ.setdefault('INGEST_MAX_INFLIGHT', '0')
+    if not args.realtime:
+        os.environ.setdefault('INGEST_SESSION_RATE', '0')
+        os.environ.setdefault('INGEST_GLOBAL_RATE', '0')
+
+    workdir = tempfile.mkdtemp(prefix='sentinelid-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    sys.path.insert(0, BACKEND_DIR)
+    from app import app
+    from database import db
+    import ml_models
+
+    # Keep trained models out of the real instance directory
+    ml_models.model_registry.model_dir = os.path.join(workdir, 'models')
+
+    recorder = Recorder()
+    with app.app_context():
+        size_before = db_size(db, db_path)
+
+    barrier = threading.Barrier(args.users + args.flood)
+    done = threading.Event()
+    threads = [threading.Thread(target=simulate_user, args=(app, recorder, i, args, barrier)) for i in range(args.users)]
+    flooders = [threading.Thread(target=flood, args=(app, recorder, i, done, barrier)) for i in range(args.flood)]
+    start = time.perf_counter()
+    for t in threads + flooders:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    done.set()
+    for t in flooders:
+        t.join()
+
+    with app.app_context():
+        size_after = db_size(db, db_path)
+        db.engine.dispose()
+    from training import training_queue
+    training_queue.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        'users': args.users,
+        'simulated_seconds': args.seconds,
+        'train': args.train,
+        'realtime': args.realtime,
+        'flood': args.flood,
+        'flood_events_shed': recorder.shed,
+        'wall_seconds': round(wall, 3),
+        'events': recorder.events,
+        'events_per_sec': round(recorder.events / wall),
+        'db_bytes_before': size_before,
+        'db_bytes_after': size_after,
+        'db_bytes_per_event': round((size_after - size_before) / max(1, recorder.events), 1),
+        'endpoints': recorder.endpoint_stats()
+    }
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{args.users} users x {args.seconds:g}s simulated in {results['wall_seconds']}s wall")
+    print(f"  {results['events']:,} events, {results['events_per_sec']:,} events/s, "
+          f"DB +{(size_after - size_before) / 1024 / 1024:.2f} MiB ({results['db_bytes_per_event']} bytes/event)")
+    if args.flood:
+        flood_requests = results['endpoints'].get('flood_batch', {}).get('requests', 0)
+        print(f"  {args.flood} flooding clients: {flood_requests:,} batches, {recorder.shed:,} events shed")
+    print(f"  {'endpoint':<16}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, r in results['endpoints'].items():
+        print(f"  {name:<16}{r['requests']:>9}{r['errors']:>8}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+
+if __name__ == '__main__':
+    main()
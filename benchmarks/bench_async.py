@@ -0,0 +1,285 @@
+"""
+Threaded (gunicorn gthread + Flask) versus async (uvicorn + asgi.py) serving
+with thousands of concurrently tracked sessions.
+
+For each mode the benchmark seeds a fresh SQLite database with --sessions
+logged-in users, starts the server as a subprocess with one worker process
+and drives it over HTTP. First --logins users log in at once (password
+hashing). Then every session streams a 50-event batch every 2s, the
+frontend's flush size, and calls /api/anomaly/check whenever next_check_ms
+says to, all paced in real time for --seconds. Sessions start at random
+offsets within the first flush interval.
+
+Reported per mode: p50/p95/p99 latency per endpoint, errors, requests and
+events per second, and how far sessions fell behind their schedule (a
+server that can't keep up shows growing lag rather than a lower rate).
+
+Each session holds its own keep-alive connection, like a browser tab, and
+the client is a minimal asyncio HTTP/1.1 implementation so that, on a
+small machine, the load generator costs far less CPU than the server.
+
+Usage: python benchmarks/bench_async.py [--sessions 1000] [--seconds 30] [--logins 20] [--modes threaded,async] [--json]
+"""
+import subprocess
+import argparse
+import tempfile
+import asyncio
+import shutil
+import random
+import socket
+import signal
+import json
+import time
+import sys
+import os
+
+import bench_common
+from bench_common import percentile
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+FLUSH_SECONDS = 2.0
+KEYSTROKES_PER_BATCH = 10
+MOUSE_PER_BATCH = 40
+CHECK_SECONDS = 5.0
+PASSWORD = 'bench-password'
+JWT_SECRET = 'bench-secret'
+REQUEST_TIMEOUT = 30.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def seed(db_path, sessions):
+    """Create users with open sessions in a fresh database and return their access tokens"""
+    script = f'''
+import json, sys, uuid
+from datetime import datetime
+from app import app
+from database import db, User, BehavioralProfile, Session
+from flask_jwt_extended import create_access_token
+from werkzeug.security import generate_password_hash
+password_hash = generate_password_hash({PASSWORD!r})
+users, profiles, sessions, tokens = [], [], [], []
+now = datetime.utcnow()
+with app.app_context():
+    for i in range({sessions}):
+        user_id, session_id = str(uuid.uuid4()), str(uuid.uuid4())
+        users.append({{'id': user_id, 'username': f'bench-{{i}}', 'email': f'bench-{{i}}@bench.local', 'password_hash': password_hash}})
+        profiles.append({{'id': str(uuid.uuid4()), 'user_id': user_id}})
+        sessions.append({{'id': session_id, 'user_id': user_id, 'login_time': now, 'last_activity': now}})
+        tokens.append(create_access_token(identity=user_id, additional_claims={{'sid': session_id}}))
+    db.session.execute(db.insert(User), users)
+    db.session.execute(db.insert(BehavioralProfile), profiles)
+    db.session.execute(db.insert(Session), sessions)
+    db.session.commit()
+json.dump(tokens, sys.stdout)
+'''
+    # A separate interpreter, so this process never imports the backend
+    out = subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=server_env(db_path),
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out[out.index('['):])
+
+
+def server_env(db_path, port=None):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + db_path, JWT_SECRET_KEY=JWT_SECRET, LOG_LEVEL='WARNING',
+               PYTHONPATH=BACKEND_DIR)
+    if port:
+        env['BIND'] = f'127.0.0.1:{port}'
+    return env
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection sending JSON POSTs"""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def post(self, path, body, token=None):
+        """Returns (status, parsed JSON body); reconnects if the server closed the connection"""
+        payload = json.dumps(body).encode()
+        head = f'POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n'
+        if token:
+            head += f'Authorization: Bearer {token}\r\n'
+        request = head.encode() + b'\r\n' + payload
+        for attempt in range(2):
+            try:
+                if self.writer is None:
+                    self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+                self.writer.write(request)
+                status = int((await self.reader.readline()).split()[1])
+                length, close = 0, False
+                while True:
+                    line = await self.reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    name = name.strip().lower()
+                    if name == 'content-length':
+                        length = int(value)
+                    elif name == 'connection' and value.strip().lower() == 'close':
+                        close = True
+                data = await self.reader.readexactly(length) if length else b''
+                if close:
+                    self.close()
+                return status, json.loads(data) if data else {}
+            except (OSError, IndexError, ValueError, asyncio.IncompleteReadError):
+                self.close()
+                if attempt:
+                    raise
+        return None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def ready(port):
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=1) as s:
+            s.sendall(b'GET /metrics HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n')
+            return s.recv(64).startswith(b'HTTP/1.1 200')
+    except OSError:
+        return False
+
+
+def start_server(mode, db_path, port):
+    if mode == 'threaded':
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+    else:
+        cmd = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+               '--no-access-log', '--log-level', 'warning']
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=server_env(db_path, port),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if ready(port):
+            return proc
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+def stop_server(proc):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+class Recorder(bench_common.Recorder):
+    async def call(self, conn, name, path, body, token=None):
+        """POST and record latency; returns the JSON body, or None on an error"""
+        start = time.perf_counter()
+        try:
+            status, data = await asyncio.wait_for(conn.post(path, body, token), REQUEST_TIMEOUT)
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            conn.close()
+            status, data = None, None
+        failed = status is None or status >= 400
+        self.record(name, time.perf_counter() - start, failed)
+        return None if failed else data
+
+
+def make_batch(rng, now_ms):
+    events = [{'type': 'keystroke', 'timestamp': now_ms + i * 200, 'dwell_time': rng.gauss(95, 15),
+               'flight_time': rng.gauss(120, 30)} for i in range(KEYSTROKES_PER_BATCH)]
+    events += [{'type': 'mouse', 'timestamp': now_ms + i * 50, 'x': rng.random() * 1920, 'y': rng.random() * 1080,
+                'speed': rng.gauss(400, 80), 'acceleration': rng.gauss(0, 50)} for i in range(MOUSE_PER_BATCH)]
+    return events
+
+
+async def track_session(port, recorder, token, seconds, rng):
+    conn = Connection(port)
+    start = time.monotonic() + rng.random() * FLUSH_SECONDS
+    next_batch, next_check = start, start + CHECK_SECONDS
+    end = start + seconds
+    while next_batch < end:
+        await asyncio.sleep(max(0.0, min(next_batch, next_check) - time.monotonic()))
+        now = time.monotonic()
+        if now >= next_batch:
+            recorder.lag.append(now - next_batch)
+            batch = make_batch(rng, int(time.time() * 1000))
+            if await recorder.call(conn, 'events_batch', '/api/behavioral/events/batch', {'events': batch}, token) is not None:
+                recorder.events += len(batch)
+            next_batch += FLUSH_SECONDS
+        if time.monotonic() >= next_check:
+            check = await recorder.call(conn, 'anomaly_check', '/api/anomaly/check', {}, token) or {}
+            next_check = time.monotonic() + check.get('next_check_ms', CHECK_SECONDS * 1000) / 1000.0
+    conn.close()
+
+
+async def login(port, recorder, index):
+    conn = Connection(port)
+    await recorder.call(conn, 'login', '/api/auth/login', {'username': f'bench-{index}', 'password': PASSWORD})
+    conn.close()
+
+
+async def drive(port, tokens, args):
+    recorder = Recorder()
+    await asyncio.gather(*[login(port, recorder, i) for i in range(args.logins)])
+    rng = random.Random(42)
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        track_session(port, recorder, token, args.seconds, random.Random(rng.random())) for token in tokens
+    ])
+    return recorder, time.perf_counter() - start
+
+
+def run_mode(mode, args):
+    workdir = tempfile.mkdtemp(prefix='sentinelid-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    try:
+        tokens = seed(db_path, args.sessions)
+        port = free_port()
+        proc = start_server(mode, db_path, port)
+        try:
+            recorder, wall = asyncio.run(drive(port, tokens, args))
+        finally:
+            stop_server(proc)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    tracked = sum(len(v) for k, v in recorder.latencies.items() if k != 'login')
+    return {
+        'mode': mode,
+        'sessions': args.sessions,
+        'wall_seconds': round(wall, 2),
+        'requests_per_sec': round(tracked / wall, 1),
+        'events_per_sec': round(recorder.events / wall),
+        'lag_p50_ms': round(percentile(recorder.lag, 50) * 1000, 1),
+        'lag_p99_ms': round(percentile(recorder.lag, 99) * 1000, 1),
+        'endpoints': recorder.endpoint_stats()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=30, help='tracking time per session')
+    parser.add_argument('--logins', type=int, default=20, help='concurrent logins before tracking starts')
+    parser.add_argument('--modes', default='threaded,async')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results only')
+    args = parser.parse_args()
+
+    results = [run_mode(mode, args) for mode in args.modes.split(',')]
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    for r in results:
+        print(f"{r['mode']}: {r['sessions']} sessions for {args.seconds:g}s, {r['requests_per_sec']} req/s, "
+              f"{r['events_per_sec']:,} events/s, schedule lag p50 {r['lag_p50_ms']} ms p99 {r['lag_p99_ms']} ms")
+        print(f"  {'endpoint':<16}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, e in r['endpoints'].items():
+            print(f"  {name:<16}{e['requests']:>9}{e['errors']:>8}{e['p50_ms']:>10}{e['p95_ms']:>10}{e['p99_ms']:>10}")
+
+
+if __name__ == '__main__':
+    main()
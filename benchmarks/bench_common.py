@@ -0,0 +1,40 @@
+"""Helpers shared by the load benchmarks (bench_api.py, bench_async.py)"""
+from collections import defaultdict
+import threading
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+
+class Recorder:
+    """Latency samples per endpoint plus error and event counters"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.events = 0
+        self.shed = 0
+        self.lag = []
+        self.lock = threading.Lock()
+
+    def record(self, name, elapsed, failed):
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            if failed:
+                self.errors[name] += 1
+
+    def endpoint_stats(self):
+        """Requests, errors and latency percentiles per endpoint"""
+        return {
+            name: {
+                'requests': len(samples),
+                'errors': self.errors[name],
+                'p50_ms': round(percentile(samples, 50) * 1000, 2),
+                'p95_ms': round(percentile(samples, 95) * 1000, 2),
+                'p99_ms': round(percentile(samples, 99) * 1000, 2),
+                'mean_ms': round(sum(samples) / len(samples) * 1000, 2)
+            }
+            for name, samples in sorted(self.latencies.items())
+        }
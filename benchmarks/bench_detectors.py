@@ -0,0 +1,136 @@
+"""
+Compare the per-user detector engines on synthetic enrollment data.
+
+Each simulated user enrolls with correlated, normally distributed feature
+vectors (the 3-feature client schema and the 13-feature server schema).
+Impostors are drawn from the same user's distribution shifted by a
+number of standard deviations, so detection rates show how each engine
+degrades as the behaviour drifts. For every engine the benchmark reports
+fit time, single-vector and batch scoring latency, serialized and in-memory
+model size, ROC AUC, the false-positive rate at the anomaly threshold
+(confidence < 30) and the detection rate at each shift.
+
+Usage: python benchmarks/bench_detectors.py [--users 20] [--samples 200] [--json]
+"""
+import argparse
+import tempfile
+import shutil
+import json
+import time
+import sys
+import os
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+ANOMALY_CONFIDENCE = 30.0
+SHIFTS = (2.0, 3.0)
+SINGLE_CALLS = 200
+
+
+def make_user(rng, n_features, n_samples):
+    """Mean, scale and correlated noise for one synthetic user"""
+    mean = rng.uniform(50, 300, n_features)
+    scale = mean * rng.uniform(0.05, 0.2, n_features)
+    mixing = rng.normal(size=(n_features, n_features)) * 0.4 + np.eye(n_features)
+    cov = mixing @ mixing.T
+    corr = cov / np.sqrt(np.outer(np.diag(cov), np.diag(cov)))
+
+    def sample(n, shift=0.0):
+        z = rng.multivariate_normal(np.zeros(n_features), corr, size=n)
+        # Shift along a random direction with unit z-score length per feature
+        direction = rng.choice([-1.0, 1.0], size=n_features)
+        return mean + scale * (z + shift * direction)
+
+    return sample(n_samples), sample
+
+
+def auc(genuine, impostor):
+    """Probability that a random impostor gets lower confidence than a random genuine sample"""
+    ranks = np.argsort(np.argsort(np.concatenate([genuine, impostor]), kind='stable')) + 1
+    n_gen, n_imp = len(genuine), len(impostor)
+    return float((ranks[:n_gen].sum() - n_gen * (n_gen + 1) / 2) / (n_gen * n_imp))
+
+
+def bench_engine(engine, users, workdir):
+    from ml_models import open_model
+
+    fit, single, batch, disk, memory = [], [], [], [], []
+    genuine_all, shifted_all = [], {shift: [] for shift in SHIFTS}
+    for index, (train, genuine, shifted) in enumerate(users):
+        path = os.path.join(workdir, f'{index}.{engine}.model')
+        model = open_model(path, engine, load=False)
+        start = time.perf_counter()
+        model.train(train.tolist())
+        fit.append(time.perf_counter() - start)
+        disk.append(os.path.getsize(path))
+        model = open_model(path, engine)
+        memory.append(model.model.nbytes if hasattr(model.model, 'nbytes') else None)
+
+        start = time.perf_counter()
+        for row in genuine[:SINGLE_CALLS]:
+            model.score(row.tolist())
+        single.append((time.perf_counter() - start) / min(SINGLE_CALLS, len(genuine)))
+
+        start = time.perf_counter()
+        genuine_all.append(model.score_batch(genuine))
+        batch.append((time.perf_counter() - start) / len(genuine))
+        for shift in SHIFTS:
+            shifted_all[shift].append(model.score_batch(shifted[shift]))
+
+    genuine_conf = np.concatenate(genuine_all)
+    results = {
+        'fit_ms': round(float(np.mean(fit)) * 1000, 2),
+        'score_single_us': round(float(np.mean(single)) * 1e6, 1),
+        'score_batch_us_per_row': round(float(np.mean(batch)) * 1e6, 2),
+        'disk_bytes': int(np.mean(disk)),
+        'memory_bytes': int(np.mean(memory)) if memory[0] is not None else None,
+        'false_positive_rate': round(float(np.mean(genuine_conf < ANOMALY_CONFIDENCE)), 4)
+    }
+    for shift in SHIFTS:
+        impostor_conf = np.concatenate(shifted_all[shift])
+        results[f'auc_{shift:g}sd'] = round(auc(genuine_conf, impostor_conf), 4)
+        results[f'detected_{shift:g}sd'] = round(float(np.mean(impostor_conf < ANOMALY_CONFIDENCE)), 4)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--samples', type=int, default=200, help='enrollment vectors per user')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results only')
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from detectors import ALL_ENGINES
+
+    workdir = tempfile.mkdtemp(prefix='sentinelid-detectors-')
+    rng = np.random.default_rng(42)
+    results = {}
+    try:
+        for n_features in (3, 13):
+            users = []
+            for _ in range(args.users):
+                train, sample = make_user(rng, n_features, args.samples)
+                users.append((train, sample(500), {shift: sample(500, shift) for shift in SHIFTS}))
+            results[n_features] = {engine: bench_engine(engine, users, workdir) for engine in ALL_ENGINES}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({'users': args.users, 'samples': args.samples, 'features': results}))
+        return
+    for n_features, engines in results.items():
+        print(f"{n_features} features, {args.users} users x {args.samples} enrollment vectors")
+        print(f"  {'engine':<18}{'fit ms':>8}{'1 row us':>10}{'batch us':>10}{'disk B':>9}{'mem B':>9}"
+              f"{'FPR':>7}" + ''.join(f"{f'AUC {s:g}sd':>10}{f'det {s:g}sd':>10}" for s in SHIFTS))
+        for engine, r in engines.items():
+            memory = r['memory_bytes'] if r['memory_bytes'] is not None else '-'
+            print(f"  {engine:<18}{r['fit_ms']:>8}{r['score_single_us']:>10}{r['score_batch_us_per_row']:>10}"
+                  f"{r['disk_bytes']:>9}{memory:>9}{r['false_positive_rate']:>7}"
+                  + ''.join(f"{r[f'auc_{s:g}sd']:>10}{r[f'detected_{s:g}sd']:>10}" for s in SHIFTS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Insert rate and on-disk size of the legacy wide behavioral_events table
+versus the narrow keystroke_events / mouse_events tables, and the size left
+after the retention job rolls everything up.
+
+Usage: python benchmarks/bench_event_store.py [--events 200000] [--batch 500] [--json]
+"""
+from datetime import datetime, timedelta
+import argparse
+import tempfile
+import shutil
+import random
+import json
+import time
+import uuid
+import sys
+import os
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+
+def make_events(n, days=10):
+    """Synthetic keystroke/mouse stream spread over the last `days` days"""
+    start = datetime.utcnow() - timedelta(days=days)
+    step = timedelta(days=days - 1) / n
+    sessions = [str(uuid.uuid4()) for _ in range(50)]
+    events = []
+    for i in range(n):
+        ts = start + step * i
+        session_id = sessions[i % len(sessions)]
+        if i % 2:
+            events.append(('keystroke', session_id, ts, {'dwell_time': random.gauss(95, 15), 'flight_time': random.gauss(120, 30), 'pressure': 0.5}))
+        else:
+            events.append(('mouse', session_id, ts, {'x': random.random() * 1920, 'y': random.random() * 1080, 'speed': random.gauss(400, 80), 'acceleration': random.gauss(0, 50), 'click_type': None}))
+    return events
+
+
+def db_size(db, engine_path):
+    db.session.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+    db.session.commit()
+    return os.path.getsize(engine_path)
+
+
+def vacuum(db):
+    db.session.commit()
+    with db.engine.connect() as conn:
+        conn.execution_options(isolation_level='AUTOCOMMIT').exec_driver_sql('VACUUM')
+
+
+def timed_insert(db, batches):
+    start = time.perf_counter()
+    for statements in batches:
+        for model, rows in statements:
+            if rows:
+                db.session.execute(db.insert(model), rows)
+        db.session.commit()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results only')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='sentinelid-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    sys.path.insert(0, BACKEND_DIR)
+    from app import app
+    from database import db, event_day, BehavioralEvent, KeystrokeEvent, MouseEvent, SessionEventRollup
+    from compact_events import compact_events
+
+    events = make_events(args.events)
+    chunks = [events[i:i + args.batch] for i in range(0, len(events), args.batch)]
+    results = {'events': args.events, 'batch': args.batch}
+
+    with app.app_context():
+        vacuum(db)
+        empty = db_size(db, db_path)
+
+        # Legacy layout: one wide row with a UUID key per event
+        legacy_batches = []
+        for chunk in chunks:
+            rows = []
+            for event_type, session_id, ts, f in chunk:
+                rows.append({
+                    'id': str(uuid.uuid4()), 'session_id': session_id, 'timestamp': ts, 'event_type': event_type,
+                    'keystroke_dwell_time': f.get('dwell_time'), 'keystroke_flight_time': f.get('flight_time'),
+                    'keystroke_pressure': f.get('pressure'), 'mouse_x': f.get('x'), 'mouse_y': f.get('y'),
+                    'mouse_speed': f.get('speed'), 'mouse_acceleration': f.get('acceleration'),
+                    'click_type': f.get('click_type'), 'page_source': None, 'page_destination': None,
+                    'time_on_page': None, 'anomaly_score': 0.0, 'is_anomalous': False
+                })
+            legacy_batches.append([(BehavioralEvent, rows)])
+        elapsed = timed_insert(db, legacy_batches)
+        results['legacy'] = {'events_per_sec': round(args.events / elapsed), 'bytes': db_size(db, db_path) - empty}
+
+        BehavioralEvent.query.delete()
+        vacuum(db)
+
+        # Compact layout: narrow per-type tables with integer keys and a day column
+        compact_batches = []
+        for chunk in chunks:
+            keystrokes, mice = [], []
+            for event_type, session_id, ts, f in chunk:
+                row = dict(f, session_id=session_id, timestamp=ts, day=event_day(ts))
+                (keystrokes if event_type == 'keystroke' else mice).append(row)
+            compact_batches.append([(KeystrokeEvent, keystrokes), (MouseEvent, mice)])
+        elapsed = timed_insert(db, compact_batches)
+        results['compact'] = {'events_per_sec': round(args.events / elapsed), 'bytes': db_size(db, db_path) - empty}
+
+        # Every event is at least a day old, so retention_days=0 rolls up all of them
+        start = time.perf_counter()
+        compacted = compact_events(retention_days=0)
+        elapsed = time.perf_counter() - start
+        vacuum(db)
+        results['rolled_up'] = {
+            'days': len(compacted),
+            'raw_events_removed': sum(compacted.values()),
+            'rollup_rows': SessionEventRollup.query.count(),
+            'seconds': round(elapsed, 3),
+            'bytes': db_size(db, db_path) - empty
+        }
+        db.engine.dispose()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"Events: {args.events} in batches of {args.batch}")
+    for layout in ('legacy', 'compact'):
+        r = results[layout]
+        print(f"  {layout:<8} {r['events_per_sec']:>10,} events/s  {r['bytes'] / 1024 / 1024:8.2f} MiB")
+    r = results['rolled_up']
+    print(f"  rollup   {r['raw_events_removed']:,} events -> {r['rollup_rows']:,} rows over {r['days']} days "
+          f"in {r['seconds']}s, {r['bytes'] / 1024 / 1024:.2f} MiB left")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Offline replay throughput (backend/replay.py) on a synthetic event history.
+
+Seeds a throwaway SQLite database with --users users, each with a trained
+isolation forest on server features and --sessions-per-user sessions of
+typing and mouse movement (one keystroke per four mouse events), about
+--events events in all. A fifth of the sessions are typed by someone
+else: slower, more erratic keystrokes, and only those sessions get a live
+alert row, so "live sessions matched" counts impostors caught.
+
+Then runs `python replay.py --json` once per --workers value and reports
+wall time, events per second, the window score distribution and how many
+sessions each threshold flags. Isolation forest anomaly scores rarely
+pass 0.3, so the default thresholds sit below the live 0.7/0.9.
+
+Usage: python benchmarks/bench_replay.py [--events 1000000] [--users 20] [--sessions-per-user 10] [--workers 1,2,4] [--thresholds 0.1,0.15,0.2] [--block-thresholds 0.25] [--json]
+"""
+import subprocess
+import argparse
+import tempfile
+import shutil
+import json
+import time
+import sys
+import os
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+MOUSE_PER_KEYSTROKE = 4
+IMPOSTOR_SHARE = 0.2
+
+
+def server_env(db_path):
+    return dict(os.environ, DATABASE_URL='sqlite:///' + db_path, LOG_LEVEL='WARNING', PYTHONPATH=BACKEND_DIR)
+
+
+def seed(db_path, model_dir, args):
+    """Create users, models, sessions and events in a separate interpreter; returns the impostor session ids"""
+    script = f'''
+import json, random, sys, uuid
+from datetime import datetime, timedelta
+from app import app
+from database import db, event_day, User, Session, KeystrokeEvent, MouseEvent, AnomalyAlert
+from feature_engine import SessionFeatures, SERVER_FEATURE_SCHEMA_VERSION
+from ml_models import ModelRegistry
+
+rng = random.Random(42)
+registry = ModelRegistry(model_dir={model_dir!r})
+events_per_session = max({MOUSE_PER_KEYSTROKE + 1}, {args.events} // ({args.users} * {args.sessions_per_user}))
+start = datetime.utcnow() - timedelta(days=3)
+impostors = []
+
+def typing(impostor):
+    return (rng.gauss(140, 45), rng.gauss(260, 90)) if impostor else (rng.gauss(95, 15), rng.gauss(120, 30))
+
+with app.app_context():
+    for u in range({args.users}):
+        user_id = str(uuid.uuid4())
+        db.session.execute(db.insert(User), [{{'id': user_id, 'username': f'replay-{{u}}', 'email': f'replay-{{u}}@bench.local', 'password_hash': 'x'}}])
+        # Baseline windows from the user's own typing, the way live snapshots are taken
+        baseline = SessionFeatures(200, 60, 25, None)
+        for i in range(3000):
+            dwell, flight = typing(False)
+            baseline.observe('keystroke', i * 0.2, dwell=dwell, flight=flight)
+            for j in range({MOUSE_PER_KEYSTROKE}):
+                baseline.observe('mouse', i * 0.2 + j * 0.05, speed=rng.gauss(400, 80), accel=rng.gauss(0, 50))
+        registry.train(user_id, list(baseline.snapshots), SERVER_FEATURE_SCHEMA_VERSION)
+
+        for s in range({args.sessions_per_user}):
+            session_id = str(uuid.uuid4())
+            login = start + timedelta(minutes=rng.randrange(3 * 24 * 60))
+            impostor = rng.random() < {IMPOSTOR_SHARE}
+            if impostor:
+                impostors.append(session_id)
+            db.session.execute(db.insert(Session), [{{'id': session_id, 'user_id': user_id, 'login_time': login, 'last_activity': login}}])
+            keystrokes, mice = [], []
+            for i in range(events_per_session):
+                ts = login + timedelta(milliseconds=i * 50)
+                if i % {MOUSE_PER_KEYSTROKE + 1} == 0:
+                    dwell, flight = typing(impostor)
+                    keystrokes.append({{'session_id': session_id, 'day': event_day(ts), 'timestamp': ts, 'dwell_time': dwell, 'flight_time': flight}})
+                else:
+                    mice.append({{'session_id': session_id, 'day': event_day(ts), 'timestamp': ts, 'x': rng.random() * 1920, 'y': rng.random() * 1080,
+                                  'speed': rng.gauss(400, 80), 'acceleration': rng.gauss(0, 50)}})
+            db.session.execute(db.insert(KeystrokeEvent), keystrokes)
+            db.session.execute(db.insert(MouseEvent), mice)
+            if impostor:
+                db.session.execute(db.insert(AnomalyAlert), [{{'id': str(uuid.uuid4()), 'session_id': session_id, 'user_id': user_id,
+                    'alert_type': 'behavioral_anomaly', 'severity': 'high', 'description': 'seeded impostor',
+                    'anomaly_score': 0.95, 'created_at': login}}])
+        db.session.commit()
+json.dump(impostors, sys.stdout)
+'''
+    # A separate interpreter, so this process never imports the backend
+    out = subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=server_env(db_path),
+                         check=True, capture_output=True, text=True).stdout
+    return out[out.index('['):]
+
+
+def run_replay(db_path, model_dir, workers, args):
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, 'replay.py', '--json', '--workers', str(workers), '--model-dir', model_dir,
+                          '--thresholds', args.thresholds, '--block-thresholds', args.block_thresholds],
+                         cwd=BACKEND_DIR, env=server_env(db_path), check=True, capture_output=True, text=True).stdout
+    wall = time.perf_counter() - start
+    report = json.loads(out[out.index('{'):])
+    report['wall_seconds'] = round(wall, 2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--sessions-per-user', type=int, default=10)
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated replay process counts')
+    parser.add_argument('--thresholds', default='0.1,0.15,0.2')
+    parser.add_argument('--block-thresholds', default='0.25')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results only')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='sentinelid-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    model_dir = os.path.join(workdir, 'models')
+    try:
+        seed_start = time.perf_counter()
+        impostors = len(json.loads(seed(db_path, model_dir, args)))
+        seed_seconds = round(time.perf_counter() - seed_start, 1)
+        results = [dict(run_replay(db_path, model_dir, int(w), args), workers=int(w)) for w in args.workers.split(',')]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({'seed_seconds': seed_seconds, 'impostor_sessions': impostors, 'runs': results}))
+        return
+    first = results[0]
+    print(f"Seeded {first['sessions']:,} sessions ({impostors} impostor), {first['events']:,} events in {seed_seconds}s")
+    print(f"  {'workers':<9}{'wall s':>8}{'replay s':>10}{'events/s':>12}{'windows':>10}")
+    for r in results:
+        print(f"  {r['workers']:<9}{r['wall_seconds']:>8}{r['seconds']:>10}{r['events_per_sec']:>12,}{r['windows']:>10,}")
+    print('Window anomaly_score ' + ', '.join(f'{k} {v}' for k, v in first['score_percentiles'].items()))
+    print('Sessions flagged per threshold (alerts, then BLOCK):')
+    for row in first['alerts'] + first['blocks']:
+        print(f"  > {row['threshold']:<6}{row['sessions']:>6} sessions ({row['live_sessions_matched']} of {impostors} impostors), "
+              f"{row['windows']:>7,} windows")
+
+
+if __name__ == '__main__':
+    main()
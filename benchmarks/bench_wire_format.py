@@ -0,0 +1,144 @@
+"""
+JSON versus the packed binary upload format (backend/wire_format.py).
+
+Batches shaped like the frontend's (one keystroke per four mouse moves)
+are encoded both ways. For each batch size the benchmark reports bytes on
+the wire per 1k events, raw and gzipped, and server CPU time per 1k events
+for three scopes: decoding and validating the body, decoding plus folding
+the events into the feature engine and profile statistics, and the whole
+POST /api/behavioral/events/batch request through Flask's test client with
+the SQLite insert.
+
+Usage: python benchmarks/bench_wire_format.py [--sizes 50,500] [--events 20000] [--json]
+"""
+import argparse
+import tempfile
+import shutil
+import random
+import json
+import gzip
+import time
+import sys
+import os
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+MOUSE_PER_KEYSTROKE = 4
+
+
+def make_events(rng, count, now_ms):
+    events = []
+    for i in range(count):
+        if i % (MOUSE_PER_KEYSTROKE + 1) == 0:
+            events.append({'type': 'keystroke', 'timestamp': now_ms + i * 40, 'dwell_time': rng.gauss(95, 15),
+                           'flight_time': rng.gauss(120, 30), 'pressure': 0.5})
+        else:
+            events.append({'type': 'mouse', 'timestamp': now_ms + i * 40, 'x': rng.randint(0, 1920),
+                           'y': rng.randint(0, 1080), 'speed': rng.gauss(400, 80), 'acceleration': 0})
+    return events
+
+
+def cpu_per_1k(fn, bodies, batch_size):
+    """Process CPU seconds per 1k events to run fn over every body"""
+    start = time.process_time()
+    for body in bodies:
+        fn(body)
+    return round((time.process_time() - start) / (len(bodies) * batch_size) * 1000 * 1000, 3)
+
+
+def interleaved_cpu_per_1k(fns, bodies, batch_size):
+    """cpu_per_1k for several (fn, bodies) pairs, alternating between them so database growth hits all equally"""
+    totals = [0.0] * len(fns)
+    for step in zip(*bodies):
+        for i, (fn, body) in enumerate(zip(fns, step)):
+            start = time.process_time()
+            fn(body)
+            totals[i] += time.process_time() - start
+    return [round(t / (len(bodies[0]) * batch_size) * 1000 * 1000, 3) for t in totals]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='50,500', help='comma-separated events per batch')
+    parser.add_argument('--events', type=int, default=20000, help='events uploaded per format and size')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results only')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='sentinelid-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    # Measure the formats, not admission control
+    os.environ.update(INGEST_SESSION_RATE='0', INGEST_GLOBAL_RATE='0', INGEST_MAX_INFLIGHT='0')
+    sys.path.insert(0, BACKEND_DIR)
+    from app import app, _split_events, _observe_events
+    import wire_format
+
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'bench', 'email': 'bench@bench.local', 'password': 'bench'})
+    token = client.post('/api/auth/login', json={'username': 'bench', 'password': 'bench'}).get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def parse_json(body):
+        return _split_events('bench-session', json.loads(body)['events'])[:2]
+
+    def parse_binary(body):
+        return wire_format.decode(body, 500)
+
+    def observe(parse):
+        def run(body):
+            keystrokes, mice = parse(body)
+            _observe_events('bench-user', 'bench-session', keystrokes, mice)
+        return run
+
+    def post(content_type):
+        def run(body):
+            resp = client.post('/api/behavioral/events/batch', headers=headers, data=body, content_type=content_type)
+            assert resp.status_code == 201, resp.get_json()
+        return run
+
+    rng = random.Random(42)
+    results = []
+    try:
+        for size in sorted(int(s) for s in args.sizes.split(',')):
+            batches = [make_events(rng, size, int(time.time() * 1000)) for _ in range(max(1, args.events // size))]
+            formats = {
+                'json': ([json.dumps({'events': b}, separators=(',', ':')).encode() for b in batches],
+                         parse_json, 'application/json'),
+                'binary': ([wire_format.encode(b) for b in batches], parse_binary, wire_format.MIMETYPE)
+            }
+            request_cpu = interleaved_cpu_per_1k([post(content_type) for _, _, content_type in formats.values()],
+                                                 [bodies for bodies, _, _ in formats.values()], size)
+            for (name, (bodies, parse, _)), request_ms in zip(formats.items(), request_cpu):
+                events = len(bodies) * size
+                with app.app_context():
+                    results.append({
+                        'format': name,
+                        'batch_size': size,
+                        'bytes_per_1k': round(sum(map(len, bodies)) / events * 1000),
+                        'gzip_bytes_per_1k': round(sum(len(gzip.compress(b)) for b in bodies) / events * 1000),
+                        'decode_cpu_ms_per_1k': cpu_per_1k(parse, bodies, size),
+                        'observe_cpu_ms_per_1k': cpu_per_1k(observe(parse), bodies, size),
+                        'request_cpu_ms_per_1k': request_ms
+                    })
+    finally:
+        # Write out pending profile statistics and alerts now; their exit hooks would run after the database is gone
+        from profile_stats import profile_updater
+        from alert_writer import alert_writer
+        profile_updater.shutdown()
+        alert_writer.shutdown()
+        with app.app_context():
+            from database import db
+            db.engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print('Per 1k events: bytes on the wire and server CPU ms')
+    print(f"  {'format':<8}{'batch':>6}{'bytes':>9}{'gzip':>8}{'decode ms':>11}{'+observe ms':>13}{'request ms':>12}")
+    for r in results:
+        print(f"  {r['format']:<8}{r['batch_size']:>6}{r['bytes_per_1k']:>9}{r['gzip_bytes_per_1k']:>8}"
+              f"{r['decode_cpu_ms_per_1k']:>11}{r['observe_cpu_ms_per_1k']:>13}{r['request_cpu_ms_per_1k']:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,9 @@ import streamlit as st
 import requests
 import pandas as pd
 import plotly.express as px
+import threading
 import json
+import time
 from datetime import datetime
 
 st.set_page_config(page_title="SentinelID Admin Dashboard", layout="wide", initial_sidebar_state="expanded")
@@ -19,168 +21,241 @@ st.title("🛡️ SentinelID Admin Dashboard")
 st.subheader("Real-time Behavioral Authentication Monitoring")
 
 API_URL = "http://127.0.0.1:5000/api"
+REFRESH_SECONDS = 2
+MAX_ALERTS = 200
 
-col1, col2, col3 = st.columns(3)
 
-try:
-    active_sessions = requests.get(f"{API_URL}/admin/active-sessions").json()
-    alerts = requests.get(f"{API_URL}/admin/alerts").json()
-    
-    with col1:
-        st.metric("Active Sessions", active_sessions.get('total_active', 0))
-    
-    with col2:
-        st.metric("Active Alerts", alerts.get('total_alerts', 0))
-    
-    with col3:
-        st.metric("System Status", "✅ Online")
-    
-    st.divider()
-    
-    tab1, tab2, tab3 = st.tabs(["👥 Active Sessions", "⚠️ Anomaly Alerts", "📊 Analytics"])
-    
-    with tab1:
-        st.subheader("Active User Sessions")
-        if active_sessions.get('sessions'):
-            df_sessions = pd.DataFrame(active_sessions['sessions'])
-            st.dataframe(df_sessions, use_container_width=True)
-            
-            st.subheader("Session Confidence Distribution")
-            if not df_sessions.empty:
-                fig = px.bar(df_sessions, x='user_id', y='current_confidence', title="User Confidence Scores")
-                st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("No active sessions")
-    
-    with tab2:
-        st.subheader("Recent Anomaly Alerts")
-        if alerts.get('alerts'):
-            df_alerts = pd.DataFrame(alerts['alerts'])
-            st.dataframe(df_alerts, use_container_width=True)
-            
-            st.subheader("Alert Severity Distribution")
-            severity_counts = df_alerts['severity'].value_counts()
-            fig = px.pie(values=severity_counts.values, names=severity_counts.index, title="Alerts by Severity")
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("No active alerts")
-    
-    with tab3:
-        st.subheader("System Analytics")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.metric("Total Sessions", active_sessions.get('total_active', 0))
-        
-        with col2:
-            st.metric("Total Alerts", alerts.get('total_alerts', 0))
-        
-        st.info("Dashboard updates in real-time. Refresh to see latest data.")
+class LiveState:
+    """
+    Sessions and alerts kept current from the backend's event stream.
+    One instance is shared by every viewer of this Streamlit server, so the
+    backend sees one snapshot load and one stream connection, not a full
+    re-fetch per rerun per operator.
+    """
 
-except requests.exceptions.ConnectionError:
-    st.error("❌ Cannot connect to SentinelID Backend. Make sure it's running on http://127.0.0.1:5000")
-except Exception as e:
-    st.error(f"Error: {str(e)}")
+    def __init__(self, api_url):
+        self.api_url = api_url
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.alerts = []
+        self.connected = False
+        self.error = None
+        self.last_event_id = None
+        self.alerts_stale = False
+        self.updated_at = None
+        threading.Thread(target=self._run, daemon=True).start()
 
-st.divider()
-st.caption("SentinelID Admin Dashboard | Real-time Behavioral Authentication Monitoring")
-EOF
-pip install streamlit plotly
+    def _load_snapshot(self):
+        """Load sessions and alerts; returns the stream event id to resume from"""
+        sessions, cursor, event_id = {}, None, None
+        while True:
+            params = {'limit': 500}
+            if cursor:
+                params['cursor'] = cursor
+            page = requests.get(f"{self.api_url}/admin/active-sessions", params=params, timeout=10).json()
+            if event_id is None:
+                # Deltas published while the pages load are replayed from here
+                event_id = page.get('event_id')
+            for s in page.get('sessions', []):
+                sessions[s['session_id']] = s
+            cursor = page.get('next_cursor')
+            if not cursor:
+                break
+        with self.lock:
+            self.sessions = sessions
+        self._load_alerts()
+        return event_id
 
-cd ~/Desktop/SentinelID/dashboard
+    def _load_alerts(self):
+        alerts = requests.get(f"{self.api_url}/admin/alerts", params={'limit': MAX_ALERTS}, timeout=10).json()
+        with self.lock:
+            self.alerts = alerts.get('alerts', [])
+            self.alerts_stale = False
+            self.updated_at = datetime.now()
 
-streamlit run admin_dashboard.py
+    def _apply(self, event_type, data):
+        with self.lock:
+            if event_type == 'session_started':
+                # setdefault: a replayed start must not reset a session the snapshot already has
+                self.sessions.setdefault(data['session_id'], {
+                    'session_id': data['session_id'], 'user_id': data['user_id'], 'login_time': data['login_time'],
+                    'current_confidence': 100.0, 'anomaly_count': 0, 'is_compromised': False, 'event_count': 0
+                })
+            elif event_type == 'session_ended':
+                self.sessions.pop(data['session_id'], None)
+            elif event_type == 'confidence':
+                session = self.sessions.get(data['session_id'])
+                if session is not None:
+                    session.update({k: v for k, v in data.items() if k != 'session_id'})
+            elif event_type == 'alert':
+                # A replayed alert may already be in the snapshot
+                if any(a['alert_id'] == data['alert_id'] for a in self.alerts):
+                    return
+                self.alerts.insert(0, data)
+                del self.alerts[MAX_ALERTS:]
+            elif event_type in ('alerts_resolved', 'alerts_acknowledged'):
+                if data['alert_ids'] is None:
+                    # Updated by filter; the stream loop reloads the open alerts
+                    self.alerts_stale = True
+                elif event_type == 'alerts_resolved':
+                    ids = set(data['alert_ids'])
+                    self.alerts = [a for a in self.alerts if a['alert_id'] not in ids]
+                else:
+                    ids = set(data['alert_ids'])
+                    for alert in self.alerts:
+                        if alert['alert_id'] in ids:
+                            alert['acknowledged'] = True
+            self.updated_at = datetime.now()
 
-cd ~/Desktop/SentinelID
+    def _stream(self):
+        headers = {'Accept': 'text/event-stream'}
+        if self.last_event_id is not None:
+            headers['Last-Event-ID'] = str(self.last_event_id)
+        with requests.get(f"{self.api_url}/admin/stream", headers=headers, stream=True, timeout=(10, 60)) as resp:
+            resp.raise_for_status()
+            self.connected = True
+            self.error = None
+            event_type, data = None, []
+            for line in resp.iter_lines(decode_unicode=True):
+                if line is None:
+                    continue
+                if line == '':
+                    if event_type == 'resync':
+                        # Missed deltas can't be replayed; reload the snapshot
+                        self.last_event_id = None
+                        return
+                    if event_type and data:
+                        message = json.loads('\n'.join(data))
+                        self.last_event_id = message['id']
+                        self._apply(event_type, message['data'])
+                        if self.alerts_stale:
+                            self._load_alerts()
+                    event_type, data = None, []
+                elif line.startswith('event:'):
+                    event_type = line[6:].strip()
+                elif line.startswith('data:'):
+                    data.append(line[5:].strip())
 
-mkdir -p dashboard
+    def _run(self):
+        backoff = 1
+        while True:
+            try:
+                # Reconnects resume from Last-Event-ID; the server answers with
+                # 'resync' when it can no longer replay what we missed
+                if self.last_event_id is None:
+                    self.last_event_id = self._load_snapshot()
+                self._stream()
+                backoff = 1
+            except Exception as e:
+                self.error = str(e)
+                backoff = min(backoff * 2, 30)
+            self.connected = False
+            time.sleep(backoff)
 
-cd dashboard
+    def snapshot(self):
+        with self.lock:
+            return list(self.sessions.values()), list(self.alerts), self.updated_at
 
-cat > admin_dashboard.py << 'DASHEOF'
 
-import streamlit as st
-import requests
-import pandas as pd
-import plotly.express as px
-import json
-from datetime import datetime
+@st.cache_resource
+def get_live_state():
+    return LiveState(API_URL)
 
-st.set_page_config(page_title="SentinelID Admin Dashboard", layout="wide", initial_sidebar_state="expanded")
 
-st.markdown("""
-<style>
-    .main { padding: 20px; }
-    h1 { color: #667eea; text-align: center; }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_data(ttl=30)
+def get_analytics(metric, granularity, top=None):
+    """Rollup-backed series; cached so reruns and extra viewers don't re-query"""
+    params = {'metric': metric, 'granularity': granularity}
+    if top:
+        params['top'] = top
+    return requests.get(f"{API_URL}/admin/analytics", params=params, timeout=10).json()
 
-st.title("🛡️ SentinelID Admin Dashboard")
-st.subheader("Real-time Behavioral Authentication Monitoring")
 
-API_URL = "http://127.0.0.1:5000/api"
+live = get_live_state()
+sessions, alerts, updated_at = live.snapshot()
+
+if live.error and not live.connected:
+    st.error(f"❌ Cannot connect to SentinelID Backend at {API_URL}: {live.error}")
 
 col1, col2, col3 = st.columns(3)
 
-try:
-    active_sessions = requests.get(f"{API_URL}/admin/active-sessions").json()
-    alerts = requests.get(f"{API_URL}/admin/alerts").json()
-    
-    with col1:
-        st.metric("Active Sessions", active_sessions.get('total_active', 0))
-    
-    with col2:
-        st.metric("Active Alerts", alerts.get('total_alerts', 0))
-    
-    with col3:
-        st.metric("System Status", "✅ Online")
-    
-    st.divider()
-    
-    tab1, tab2, tab3 = st.tabs(["👥 Active Sessions", "⚠️ Anomaly Alerts", "📊 Analytics"])
-    
-    with tab1:
-        st.subheader("Active User Sessions")
-        if active_sessions.get('sessions'):
-            df_sessions = pd.DataFrame(active_sessions['sessions'])
-            st.dataframe(df_sessions, use_container_width=True)
-            
-            st.subheader("Session Confidence Distribution")
-            if not df_sessions.empty:
-                fig = px.bar(df_sessions, x='user_id', y='current_confidence', title="User Confidence Scores")
-                st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("No active sessions")
-    
-    with tab2:
-        st.subheader("Recent Anomaly Alerts")
-        if alerts.get('alerts'):
-            df_alerts = pd.DataFrame(alerts['alerts'])
-            st.dataframe(df_alerts, use_container_width=True)
-            
-            st.subheader("Alert Severity Distribution")
-            severity_counts = df_alerts['severity'].value_counts()
-            fig = px.pie(values=severity_counts.values, names=severity_counts.index, title="Alerts by Severity")
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("No active alerts")
-    
-    with tab3:
-        st.subheader("System Analytics")
+with col1:
+    st.metric("Active Sessions", len(sessions))
+
+with col2:
+    st.metric("Active Alerts", len(alerts))
+
+with col3:
+    st.metric("System Status", "✅ Live" if live.connected else "⏳ Reconnecting")
+
+st.divider()
+
+tab1, tab2, tab3 = st.tabs(["👥 Active Sessions", "⚠️ Anomaly Alerts", "📊 Analytics"])
+
+with tab1:
+    st.subheader("Active User Sessions")
+    if sessions:
+        df_sessions = pd.DataFrame(sessions)
+        st.dataframe(df_sessions, use_container_width=True)
+
+        st.subheader("Session Confidence Distribution")
+        fig = px.bar(df_sessions, x='user_id', y='current_confidence', title="User Confidence Scores")
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("No active sessions")
+
+with tab2:
+    st.subheader("Recent Anomaly Alerts")
+    if alerts:
+        df_alerts = pd.DataFrame(alerts)
+        st.dataframe(df_alerts, use_container_width=True)
+
+        st.subheader("Alert Severity Distribution")
+        severity_counts = df_alerts['severity'].value_counts()
+        fig = px.pie(values=severity_counts.values, names=severity_counts.index, title="Alerts by Severity")
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("No active alerts")
+
+with tab3:
+    st.subheader("System Analytics")
+    granularity = st.radio("Resolution", ["minute", "hour"], horizontal=True)
+
+    try:
         col1, col2 = st.columns(2)
-        
+
         with col1:
-            st.metric("Total Sessions", active_sessions.get('total_active', 0))
-        
+            alert_series = get_analytics('alerts_by_severity', granularity).get('series', [])
+            if alert_series:
+                fig = px.bar(pd.DataFrame(alert_series), x='bucket', y='count', color='dimension', title="Alerts by Severity")
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("No alerts in this window")
+
         with col2:
-            st.metric("Total Alerts", alerts.get('total_alerts', 0))
-        
-        st.info("Dashboard updates in real-time. Refresh to see latest data.")
+            event_series = get_analytics('events', granularity).get('series', [])
+            if event_series:
+                fig = px.line(pd.DataFrame(event_series), x='bucket', y='count', color='dimension', title="Events by Type")
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("No events in this window")
 
-except requests.exceptions.ConnectionError:
-    st.error("❌ Cannot connect to SentinelID Backend. Make sure it's running on http://127.0.0.1:5000")
-except Exception as e:
-    st.error(f"Error: {str(e)}")
+        confidence_series = get_analytics('session_confidence', granularity).get('series', [])
+        if confidence_series:
+            df_confidence = pd.DataFrame(confidence_series)
+            fig = px.line(df_confidence, x='bucket', y=['mean', 'p50', 'p95'], title="Session Confidence")
+            st.plotly_chart(fig, use_container_width=True)
+
+        top_users = get_analytics('user_anomalies', granularity, top=10).get('top', [])
+        if top_users:
+            st.subheader("Most Anomalous Users")
+            st.dataframe(pd.DataFrame(top_users).rename(columns={'dimension': 'user_id'}), use_container_width=True)
+    except requests.exceptions.RequestException as e:
+        st.error(f"❌ Could not load analytics: {e}")
 
 st.divider()
-st.caption("SentinelID Admin Dashboard | Real-time Behavioral Authentication Monitoring")
+st.caption(f"SentinelID Admin Dashboard | Last update: {updated_at.strftime('%H:%M:%S') if updated_at else '—'}")
+
+# Re-render from local state; this does not touch the backend
+time.sleep(REFRESH_SECONDS)
+st.rerun()
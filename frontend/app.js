@@ -111,10 +111,92 @@ async function handleLogin() {
 function startBehaviorMonitoring() {
     document.addEventListener('keydown', trackKeystroke);
     document.addEventListener('mousemove', trackMouse);
-    setInterval(checkAnomalies, 5000);
+    scheduleAnomalyCheck(DEFAULT_CHECK_MS);
     addLogEntry('🔍 Behavioral monitoring started');
 }
 
+// Behavioral events are buffered and uploaded in batches instead of one request per event
+const EVENT_FLUSH_SIZE = 50;
+const EVENT_FLUSH_INTERVAL = 2000;
+let eventBuffer = [];
+let eventFlushTimer = null;
+
+function queueEvent(event) {
+    event.timestamp = Date.now();
+    eventBuffer.push(event);
+    
+    if (eventBuffer.length >= EVENT_FLUSH_SIZE) {
+        flushEvents();
+    } else if (!eventFlushTimer) {
+        eventFlushTimer = setTimeout(flushEvents, EVENT_FLUSH_INTERVAL);
+    }
+}
+
+// Uploads use the packed binary layout from backend/wire_format.py: an
+// 8-byte header, then per event type a 16-byte block header and one
+// little-endian float32 column per field. NaN marks a missing value.
+const EVENT_MIMETYPE = 'application/x-sentinelid-events';
+const EVENT_BLOCKS = [
+    ['keystroke', 1, ['dwell_time', 'flight_time', 'pressure']],
+    ['mouse', 2, ['x', 'y', 'speed', 'acceleration', 'click_type']]
+];
+const CLICK_TYPES = ['left', 'right', 'middle'];
+
+function encodeEvents(events) {
+    const blocks = EVENT_BLOCKS
+        .map(([type, code, fields]) => [code, fields, events.filter(e => e.type === type)])
+        .filter(([, , rows]) => rows.length > 0);
+    let size = 8;
+    for (const [, fields, rows] of blocks) size += 16 + 4 * (fields.length + 1) * rows.length;
+
+    const view = new DataView(new ArrayBuffer(size));
+    'SIDE'.split('').forEach((c, i) => view.setUint8(i, c.charCodeAt(0)));
+    view.setUint8(4, 1);
+    view.setUint8(5, blocks.length);
+    let offset = 8;
+    for (const [code, fields, rows] of blocks) {
+        const base = rows[0].timestamp;
+        view.setUint8(offset, code);
+        view.setUint32(offset + 4, rows.length, true);
+        view.setFloat64(offset + 8, base, true);
+        offset += 16;
+        const columns = [e => e.timestamp - base].concat(fields.map(field => field === 'click_type'
+            ? e => { const i = CLICK_TYPES.indexOf(e.click_type); return i < 0 ? null : i; }
+            : e => e[field]));
+        for (const value of columns) {
+            for (const e of rows) {
+                const v = value(e);
+                view.setFloat32(offset, v === null || v === undefined ? NaN : v, true);
+                offset += 4;
+            }
+        }
+    }
+    return view.buffer;
+}
+
+function flushEvents() {
+    if (eventFlushTimer) {
+        clearTimeout(eventFlushTimer);
+        eventFlushTimer = null;
+    }
+    if (eventBuffer.length === 0 || !authToken) return Promise.resolve();
+    
+    const events = eventBuffer;
+    eventBuffer = [];
+    
+    return fetch(`${API_URL}/behavioral/events/batch`, {
+        method: 'POST',
+        keepalive: true,
+        headers: {
+            'Content-Type': EVENT_MIMETYPE,
+            'Authorization': `Bearer ${authToken}`
+        },
+        body: encodeEvents(events)
+    }).catch(e => console.error('Event batch upload failed:', e));
+}
+
+window.addEventListener('pagehide', flushEvents);
+
 let lastKeystrokeTime = 0;
 let keyDownTime = 0;
 
@@ -129,18 +211,12 @@ document.addEventListener('keyup', function(e) {
     lastKeystrokeTime = keyUpTime;
     
     if (authToken && sessionActive) {
-        fetch(`${API_URL}/behavioral/keystroke`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'Authorization': `Bearer ${authToken}`
-            },
-            body: JSON.stringify({
-                dwell_time: dwellTime,
-                flight_time: flightTime,
-                pressure: 0.5
-            })
-        }).catch(e => console.error('Keystroke logging failed:', e));
+        queueEvent({
+            type: 'keystroke',
+            dwell_time: dwellTime,
+            flight_time: flightTime,
+            pressure: 0.5
+        });
     }
 });
 
@@ -160,27 +236,32 @@ document.addEventListener('mousemove', function(e) {
     const timeDiff = (now - lastMouseTime) / 1000;
     const speed = timeDiff > 0 ? distance / timeDiff : 0;
     
-    fetch(`${API_URL}/behavioral/mouse`, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-            'Authorization': `Bearer ${authToken}`
-        },
-        body: JSON.stringify({
-            x: e.clientX,
-            y: e.clientY,
-            speed: speed,
-            acceleration: 0
-        })
-    }).catch(e => console.error('Mouse logging failed:', e));
+    queueEvent({
+        type: 'mouse',
+        x: e.clientX,
+        y: e.clientY,
+        speed: speed,
+        acceleration: 0
+    });
     
     lastMouseTime = now;
     lastMouseX = e.clientX;
     lastMouseY = e.clientY;
 });
 
+// The server suggests when to check next: rarely while confidence is high and
+// steady, every couple of seconds while it is low or falling
+const DEFAULT_CHECK_MS = 5000;
+let anomalyCheckTimer = null;
+
+function scheduleAnomalyCheck(delay) {
+    clearTimeout(anomalyCheckTimer);
+    anomalyCheckTimer = setTimeout(checkAnomalies, delay);
+}
+
 async function checkAnomalies() {
     if (!authToken || !sessionActive) return;
+    let nextCheck = DEFAULT_CHECK_MS;
     
     try {
         const response = await fetch(`${API_URL}/anomaly/check`, {
@@ -203,10 +284,17 @@ async function checkAnomalies() {
         if (data.is_anomalous) {
             addLogEntry(`⚠️ Anomaly detected (Score: ${data.anomaly_score.toFixed(2)})`, true);
         }
+        if (data.next_check_ms) {
+            nextCheck = data.next_check_ms;
+        }
         
     } catch (error) {
         console.error('Anomaly check failed:', error);
     }
+    
+    if (sessionActive) {
+        scheduleAnomalyCheck(nextCheck);
+    }
 }
 
 function addLogEntry(message, isAnomaly = false) {
@@ -226,6 +314,7 @@ function addLogEntry(message, isAnomaly = false) {
 
 async function handleLogout() {
     try {
+        await flushEvents();
         await fetch(`${API_URL}/auth/logout`, {
             method: 'POST',
             headers: {
@@ -236,6 +325,7 @@ async function handleLogout() {
         authToken = null;
         currentUserId = null;
         sessionActive = false;
+        clearTimeout(anomalyCheckTimer);
         
         document.getElementById('authForm').style.display = 'block';
         document.getElementById('dashboard').style.display = 'none';